@@ -0,0 +1,45 @@
+from itertools import combinations
+import numpy as np
+import Evaluator
+
+# Vectorised counterpart of PokerHand / Evaluator.evaluate for arrays of packed card codes.
+# evaluate_batch(cards) takes an (N, 5), (N, 6) or (N, 7) integer array and returns
+# (ranks, categories): the (N,) strengths (same scale as PokerHand.rank) and the
+# (N,) category names used as keys of PokerHand.hand_value.
+
+FLUSHES = np.array(Evaluator.FLUSHES, dtype=np.int16)
+UNIQUE5 = np.array(Evaluator.UNIQUE5, dtype=np.int16)
+PRODUCT_KEYS = np.array(sorted(Evaluator.PRODUCTS), dtype=np.int64)
+PRODUCT_VALUES = np.array([Evaluator.PRODUCTS[k] for k in sorted(Evaluator.PRODUCTS)], dtype=np.int16)
+CATEGORY = np.array([''] + Evaluator.CATEGORY[1:])
+
+
+def _evaluate5(c0, c1, c2, c3, c4):
+	mask = (c0 | c1 | c2 | c3 | c4) >> 16
+	flush = (c0 & c1 & c2 & c3 & c4 & 0xF000) != 0
+	ranks = UNIQUE5[mask]
+
+	paired = ranks == 0
+	product = (c0 & 0xFF) * (c1 & 0xFF) * (c2 & 0xFF) * (c3 & 0xFF) * (c4 & 0xFF)
+	ranks[paired] = PRODUCT_VALUES[np.searchsorted(PRODUCT_KEYS, product[paired])]
+
+	ranks[flush] = FLUSHES[mask[flush]]
+	return ranks
+
+
+def evaluate_ranks(cards):
+	cards = np.asarray(cards, dtype=np.int64)
+	assert cards.ndim == 2 and 5 <= cards.shape[1] <= 7, 'Expected an (N, 5), (N, 6) or (N, 7) array of card codes'
+	cols = [cards[:, i] for i in range(cards.shape[1])]
+
+	best = None
+	# at most 21 fixed column choices, each one evaluated for all rows at once
+	for idx in combinations(range(len(cols)), 5):
+		ranks = _evaluate5(*[cols[i] for i in idx])
+		best = ranks if best is None else np.maximum(best, ranks)
+	return best
+
+
+def evaluate_batch(cards):
+	ranks = evaluate_ranks(cards)
+	return ranks, CATEGORY[ranks]
@@ -0,0 +1,229 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from Deck import PokerCard, PokerDeck, PokerHand
+from Evaluator import evaluate
+from Events import NullSink
+from PokerMatch import PokerMatch, PokerPlayer, AIPlayer, get_strongest_hand, decide_winner
+
+# Micro-benchmarks and full-hand simulation, written as JSON and optionally compared
+# against a stored baseline:
+#   python Benchmark.py --out baseline.json
+#   python Benchmark.py --compare baseline.json
+# Every benchmark builds its inputs from a fixed seed, then times a callable that does
+# `ops` operations. The reported figure is the best and median ns per operation over
+# several repeats, each one long enough to take about --min-time seconds.
+
+BENCHMARKS = []
+
+
+def benchmark(name, ops=1):
+	def register(setup):
+		BENCHMARKS.append((name, ops, setup))
+		return setup
+	return register
+
+
+def _random_cards(rng, n, count):
+	return [rng.sample(PokerCard.CARDS, n) for _ in range(count)]
+
+
+def _players(hands):
+	players = []
+	for i, cards in enumerate(hands):
+		p = PokerPlayer('P{}'.format(i))
+		p.cards = list(cards)
+		players.append(p)
+	return players
+
+
+@benchmark('card_create', ops=52)
+def _card_create(rng):
+	args = [(v, s) for v in range(1, 14) for s in ('Spades', 'Hearts', 'Diamonds', 'Clubs')]
+	def run():
+		for v, s in args:
+			PokerCard(v, s)
+	return run
+
+
+@benchmark('deck_deal_52')
+def _deck_deal_all(rng):
+	# shuffle() is just reset(): the cost of a full shuffle is drawing the whole deck
+	deck = PokerDeck(rng)
+	def run():
+		deck.reset()
+		deck.deal(52)
+	return run
+
+
+@benchmark('deck_deal_21')
+def _deck_deal(rng):
+	# 8 players and a board
+	deck = PokerDeck(rng)
+	def run():
+		deck.reset()
+		deck.deal(21)
+	return run
+
+
+@benchmark('hand_classify', ops=1000)
+def _hand_classify(rng):
+	hands = _random_cards(rng, 5, 1000)
+	def run():
+		for cards in hands:
+			PokerHand(cards).classify()
+	return run
+
+
+@benchmark('get_winner', ops=1000)
+def _get_winner(rng):
+	hands = [PokerHand(c) for c in _random_cards(rng, 5, 1001)]
+	pairs = list(zip(hands, hands[1:]))
+	def run():
+		for a, b in pairs:
+			a.get_winner(b)
+	return run
+
+
+@benchmark('evaluate_7', ops=1000)
+def _evaluate7(rng):
+	hands = _random_cards(rng, 7, 1000)
+	def run():
+		for cards in hands:
+			evaluate(cards)
+	return run
+
+
+@benchmark('get_strongest_hand', ops=1000)
+def _strongest(rng):
+	# each call takes the next 1000 of a pool larger than the default best-hand cache, so
+	# spots do not repeat before they would have been evicted
+	spots = [(cards[:2], cards[2:]) for cards in _random_cards(rng, 7, 100000)]
+	player = _players([[]])[0]
+	start = [0]
+	def run():
+		i = start[0]
+		for hole, board in spots[i:i + 1000]:
+			player.cards = hole
+			get_strongest_hand(player, board)
+		start[0] = (i + 1000) % len(spots)
+	return run
+
+
+def _decide_winner(nplayers):
+	def setup(rng):
+		spots = []
+		for cards in _random_cards(rng, 2 * nplayers + 5, 200):
+			spots.append((_players([cards[i:i + 2] for i in range(0, 2 * nplayers, 2)]), cards[2 * nplayers:]))
+		def run():
+			for players, board in spots:
+				decide_winner(players, board)
+		return run
+	return setup
+
+
+def _match_hands(nplayers, hands):
+	def setup(rng):
+		random.seed(rng.getrandbits(64))
+		match = PokerMatch([AIPlayer('AI-{}'.format(i)) for i in range(nplayers)], sink=NullSink(), rng=rng)
+		def run():
+			for _ in range(hands):
+				match.play_hand()
+				match.rotate()
+		return run
+	return setup
+
+
+for _n in (3, 8):
+	benchmark('decide_winner_{}'.format(_n), ops=200)(_decide_winner(_n))
+# full rings and beyond: 23 seats use 51 of the 52 cards
+for _n in list(range(3, 9)) + [10, 16, 23]:
+	benchmark('match_hand_{}'.format(_n), ops=100)(_match_hands(_n, 100))
+
+
+def measure(setup, ops, repeat=5, min_time=0.2, seed=0):
+	run = setup(random.Random(seed))
+	# calls per repeat, grown until one repeat takes min_time
+	number = 1
+	while True:
+		t = time.perf_counter()
+		for _ in range(number):
+			run()
+		elapsed = time.perf_counter() - t
+		if elapsed >= min_time:
+			break
+		number*= 2
+	times = [elapsed]
+	for _ in range(repeat - 1):
+		t = time.perf_counter()
+		for _ in range(number):
+			run()
+		times.append(time.perf_counter() - t)
+	per_op = sorted(x * 1e9 / (number * ops) for x in times)
+	return {'ns_per_op': per_op[0], 'median_ns': per_op[len(per_op) // 2], 'ops_per_s': 1e9 / per_op[0],
+			'calls': number, 'repeat': repeat}
+
+
+def run_all(names=None, repeat=5, min_time=0.2, out=sys.stdout):
+	results = {}
+	for name, ops, setup in BENCHMARKS:
+		if names and not any(n in name for n in names):
+			continue
+		r = measure(setup, ops, repeat, min_time)
+		results[name] = r
+		if out is not None:
+			print('{:<22} {:>12.1f} ns/op  {:>12.0f} ops/s'.format(name, r['ns_per_op'], r['ops_per_s']), file=out)
+	return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+			'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'benchmarks': results}
+
+
+def compare(results, baseline, threshold=0.1):
+	# (name, baseline ns, current ns, ratio, regressed) for benchmarks present in both
+	rows = []
+	old = baseline['benchmarks']
+	for name, r in results['benchmarks'].items():
+		if name not in old:
+			continue
+		ratio = r['ns_per_op'] / old[name]['ns_per_op']
+		rows.append((name, old[name]['ns_per_op'], r['ns_per_op'], ratio, ratio > 1 + threshold))
+	return rows
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Poker benchmarks')
+	parser.add_argument('names', nargs='*', help='only run benchmarks whose name contains one of these')
+	parser.add_argument('--out', help='write results as JSON to this file')
+	parser.add_argument('--compare', help='baseline JSON to compare against')
+	parser.add_argument('--threshold', type=float, default=0.1, help='slowdown ratio counted as a regression (default 0.1)')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--min-time', type=float, default=0.2, help='seconds per repeat')
+	parser.add_argument('--list', action='store_true', help='list benchmark names')
+	args = parser.parse_args(argv)
+
+	if args.list:
+		for name, _, _ in BENCHMARKS:
+			print(name)
+		return 0
+
+	results = run_all(args.names, args.repeat, args.min_time)
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		rows = compare(results, baseline, args.threshold)
+		print()
+		for name, old, new, ratio, regressed in rows:
+			print('{:<22} {:>12.1f} -> {:>12.1f} ns/op  {:>6.2f}x{}'.format(name, old, new, ratio, '  REGRESSION' if regressed else ''))
+		if any(r[4] for r in rows):
+			return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
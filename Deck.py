@@ -1,234 +1,181 @@
 import random
 from collections import Counter
+from Evaluator import PRIMES, CATEGORY, evaluate5
+
+# Cards are packed ints (Cactus Kev layout), interned from a 52-entry table:
+#   xxxbbbbb bbbbbbbb cdhsrrrr xxpppppp
+# b = rank bit, cdhs = suit bit, r = rank (0 = deuce .. 12 = ace), p = rank prime
+class Card(int):
+	__slots__ = ()
+	SUIT_STR = {'Clubs': '\u2663', 'Hearts': '\u2665', 'Diamonds': '\u2666', 'Spades': '\u2660'}
+	VALUE_STR = {1:'A', 2:'2', 3:'3', 4:'4', 5:'5', 6:'6', 7:'7', 8:'8', 9:'9', 10:'10', 11:'J', 12:'Q', 13:'K'}
+	SUITS = ['Spades', 'Hearts', 'Diamonds', 'Clubs']
+	SUIT_IDX = {'Spades': 0, 'Hearts': 1, 'Diamonds': 2, 'Clubs': 3}
+	PRIMES = PRIMES
+	# rank (0..12) -> value (1..13, ace = 1)
+	RANK_VALUE = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 1]
+	# suit bit (1, 2, 4, 8) -> suit index
+	SUIT_BIT_IDX = {1: 0, 2: 1, 4: 2, 8: 3}
+
+	def __new__(cls, value, suit):
+		return cls.CARDS[((value + 11) % 13) * 4 + Card.SUIT_IDX[suit]]
 
-class Card(object):
-	def __init__(self, value, suit):
-		self.value = value
-		self.suit = suit		
-		Card.SUIT_STR = {'Clubs': '\u2663', 'Hearts': '\u2665', 'Diamonds': '\u2666', 'Spades': '\u2660'}
-		Card.VALUE_STR = {1:'A', 2:'2', 3:'3', 4:'4', 5:'5', 6:'6', 7:'7', 8:'8', 9:'9', 10:'10', 11:'J', 12:'Q', 13:'K'}
+	@staticmethod
+	def encode(rank, suit_idx):
+		return (1 << (16 + rank)) | (1 << (12 + suit_idx)) | (rank << 8) | Card.PRIMES[rank]
+
+	@classmethod
+	def from_code(cls, code):
+		return cls.CODES[code]
+
+	@classmethod
+	def from_index(cls, index):
+		return cls.CARDS[index]
+
+	@property
+	def rank(self):
+		return (self >> 8) & 0xF
+
+	@property
+	def value(self):
+		return Card.RANK_VALUE[(self >> 8) & 0xF]
 
-	def __eq__(self, other):
-		return self.value == other.value
+	@property
+	def suit(self):
+		return Card.SUITS[Card.SUIT_BIT_IDX[(self >> 12) & 0xF]]
 
-	def __str__(self):		
+	@property
+	def index(self):
+		return ((self >> 8) & 0xF) * 4 + Card.SUIT_BIT_IDX[(self >> 12) & 0xF]
+
+	def __reduce__(self):
+		return (self.__class__.from_index, (self.index,))
+
+	def __str__(self):
 		return '{}{}'.format(Card.VALUE_STR[self.value], Card.SUIT_STR[self.suit])
 
-	
+	def __repr__(self):
+		return self.__str__()
+
+	def __format__(self, spec):
+		return format(self.__str__(), spec)
+
+
 class PokerCard(Card):
-	def __init__(self, value, suit):
-		super().__init__(value, suit)
-
-	def __gt__(self, other):
-		if self.value == 1 and other.value != 1:
-			return True
-		elif other.value == 1 and self.value != 1:
-			return False
-		else:
-			return self.value > other.value
-			
+	__slots__ = ()
+
+
+def _intern_cards(cls):
+	cls.CARDS = [int.__new__(cls, Card.encode(r, s)) for r in range(13) for s in range(4)]
+	cls.CODES = {int(c): c for c in cls.CARDS}
+
+_intern_cards(Card)
+_intern_cards(PokerCard)
+
 
 class PokerDeck(object):
-	def __init__(self):
-		self.cards = []
-		values = range(1, 14)
-		suits = ['Hearts', 'Diamonds', 'Spades', 'Clubs']
+	# A permanent pool of the 52 interned cards. Cards are dealt by partial Fisher-Yates:
+	# pick() swaps a random undealt card to the front, so reset() is O(1) and only as
+	# many swaps are made as cards are drawn.
+	def __init__(self, rng=None):
+		self.rng = rng if rng is not None else random
+		self.pool = list(PokerCard.CARDS)
+		# pool[:top] dealt, pool[top:live] undealt, pool[live:] removed
+		self.top = 0
+		self.live = 52
+
 
-		for v in values:
-			for s in suits:
-				self.cards.append(PokerCard(v, s))
-		
-		self.shuffle()
+	@property
+	def cards(self):
+		return self.pool[self.top:self.live]
 
 
 	def has_cards(self):
-		return len(self.cards) > 0
+		return self.top < self.live
 
 
 	def pick(self):
-		if self.has_cards():
-			return self.cards.pop()
-		else:
+		top = self.top
+		if top >= self.live:
 			return None
+		pool = self.pool
+		j = top + int(self.rng.random() * (self.live - top))
+		card = pool[j]
+		other = pool[top]
+		pool[top] = card
+		pool[j] = other
+		self.top = top + 1
+		return card
+
+
+	def deal(self, n):
+		assert self.top + n <= self.live, 'Not enough cards in the deck'
+		pool = self.pool
+		rand = self.rng.random
+		live = self.live
+		top = self.top
+		for i in range(top, top + n):
+			j = i + int(rand() * (live - i))
+			card = pool[j]
+			other = pool[i]
+			pool[i] = card
+			pool[j] = other
+		self.top = top + n
+		return pool[top:top + n]
+
+
+	def remove(self, cards):
+		# take known cards out until restore(), e.g. hole cards and board in equity work.
+		# Cards are looked up by scanning the pool, which keeps the dealing path free of
+		# position bookkeeping.
+		self.reset()
+		pool = self.pool
+		for c in cards:
+			p = pool.index(c)
+			if p >= self.live:
+				continue
+			self.live-= 1
+			pool[p] = pool[self.live]
+			pool[self.live] = c
+
+
+	def reset(self):
+		# every dealt card back in, removed cards stay out
+		self.top = 0
+
+
+	def restore(self):
+		self.top = 0
+		self.live = 52
 
 
 	def shuffle(self):
-		random.shuffle(self.cards)
+		self.reset()
 
 
 class PokerHand(object):
+	hand_value = {'Royal flush': 10, 'Straight flush': 9, 'Four of a kind': 8, 'Full house': 7,
+				'Flush': 6, 'Straight': 5, 'Three of a kind': 4, 'Two pair': 3, 'Pair': 2, 'High card': 1}
+	__slots__ = ('cards', 'rank', 'hand')
+
 	def __init__(self, cards):
 		assert len(cards) == 5, 'Poker hand should have 5 cards'
-		self.cards = sorted([PokerCard(c.value, c.suit) for c in cards])
-		PokerHand.hand_value = {'Royal flush': 10, 'Straight flush': 9, 'Four of a kind': 8, 'Full house': 7,
-								'Flush': 6, 'Straight': 5, 'Three of a kind': 4, 'Two pair': 3, 'Pair': 2, 'High card': 1}
-
-		self.hand = self.classify()
+		self.cards = sorted(cards)
+		# strength in 1..7462, higher is better (see Evaluator)
+		self.rank = evaluate5(*self.cards)
+		self.hand = CATEGORY[self.rank]
 
 
 	def get_winner(self, other):
-		if PokerHand.hand_value[self.hand] > PokerHand.hand_value[other.hand]:
+		if self.rank > other.rank:
 			return 1
-		elif PokerHand.hand_value[self.hand] < PokerHand.hand_value[other.hand]:
+		elif self.rank < other.rank:
 			return -1
-		elif PokerHand.hand_value[self.hand] == PokerHand.hand_value[other.hand]:
-			# High card
-			if self.hand == 'High card':
-				cards_a = sorted(self.cards, reverse=True)
-				cards_b = sorted(other.cards, reverse=True)				
-
-				for a, b in zip(cards_a, cards_b):
-					if a > b:
-						return 1
-					elif a < b:
-						return -1
-				return 0
-
-			# Pair
-			elif self.hand == 'Pair':
-				counter_hand = Counter([c.value for c in self.cards])
-				pair_hand = [k for k, v in counter_hand.items() if v==2][0]
-
-				counter_other = Counter([c.value for c in other.cards])
-				pair_other = [k for k, v in counter_other.items() if v==2][0]
-
-				if PokerCard(pair_hand, '-') > PokerCard(pair_other, '-'):
-					return 1
-				elif PokerCard(pair_hand, '-') < PokerCard(pair_other, '-'):
-					return -1				
-				else:
-					kickers_hand = sorted([PokerCard(c.value, '-') for c in self.cards if c.value != pair_hand], reverse=True)
-					kickers_other = sorted([PokerCard(c.value, '-') for c in other.cards if c.value != pair_other], reverse=True)
-
-					for a, b in zip(kickers_hand, kickers_other):
-						if a > b:
-							return 1
-						elif a < b:
-							return -1
-					return 0
-			# Two pair
-			elif self.hand == 'Two pair':
-				counter_hand = Counter([c.value for c in self.cards])				
-				pairs_hand = sorted([PokerCard(k, '-') for k, v in counter_hand.items() if v==2], reverse=True)
-
-				counter_other = Counter([c.value for c in other.cards])
-				pairs_other = sorted([PokerCard(k, '-') for k, v in counter_other.items() if v==2], reverse=True)
-
-				for a, b in zip(pairs_hand, pairs_other):
-					if a > b:
-						return 1
-					elif a < b:
-						return -1
-
-				kicker_hand = [PokerCard(k, '-') for k, v in counter_hand.items() if v!=2]
-				kicker_other = [PokerCard(k, '-') for k, v in counter_other.items() if v!=2]
-				if PokerCard(kicker_hand, '-') > PokerCard(kicker_other, '-'):
-					return 1
-				elif PokerCard(kicker_hand, '-') < PokerCard(kicker_other, '-'):
-					return -1
-				return 0
-
-			# Three of a kind
-			elif self.hand == 'Three of a kind':
-				counter_hand = Counter([c.value for c in self.cards])
-				three_hand = [k for k, v in counter_hand.items() if v==3][0]
-
-				counter_other = Counter([c.value for c in other.cards])
-				three_other = [k for k, v in counter_other.items() if v==3][0]
-
-				if PokerCard(three_hand, '-') > PokerCard(three_other, '-'):
-					return 1
-				elif PokerCard(three_hand, '-') < PokerCard(three_other, '-'):
-					return -1
-
-				kicker_hand = sorted([PokerCard(k, '-') for k, v in counter_hand.items() if v!=3], reverse=True)
-				kicker_other = sorted([PokerCard(k, '-') for k, v in counter_other.items() if v!=3], reverse=True)
-
-				for a, b in zip(kicker_hand, kicker_other):
-					if a > b:
-						return 1
-					elif a < b:
-						return -1
-				return 0
-			
-			elif self.hand == 'Straight flush' or self.hand == 'Straight':
-				if max(self.cards) > max(other.cards):
-					return 1
-				elif max(self.cards) < max(other.cards):
-					return -1
-				return 0
-
-			elif self.hand == 'Flush':
-				my_hand = sorted([PokerCard(c.value, '') for c in self.cards], reverse=True)
-				other_hand = sorted([PokerCard(c.value, '') for c in other.cards], reverse=True)
-
-				for a, b in zip(my_hand, other_hand):
-					if a > b:
-						return 1
-					elif a < b:
-						return -1
-				return 0
-
-			elif self.hand == 'Full house':
-				counter_hand = Counter([c.value for c in self.cards])
-				counter_other = Counter([c.value for c in other.cards])
-
-				for rep in [3, 2]:
-					my_hand = [k for k, v in counter_hand.items() if v==rep][0]			
-					other_hand = [k for k, v in counter_other.items() if v==rep][0]
-					if PokerCard(my_hand, '') > PokerCard(other_hand, ''):
-						return 1
-					elif PokerCard(my_hand, '') < PokerCard(other_hand, ''):
-						return -1
-				return 0
-
-			elif self.hand == 'Four of a kind' or self.hand == 'Royal flush':
-				return 0
-
+		return 0
 
 
 	def classify(self):
-		n_suits = len(set(c.suit for c in self.cards))
-		cards = self.cards
-
-		is_royal = False
-		is_straight = False
-				
-		if cards[-1].value == 1 and cards[0].value == 10 and all([(cards[i + 1].value - cards[i].value) == 1 for i in range(3)]):
-			is_royal = True
-			is_straight = True		
-		elif cards[-1].value == 1 and cards[0].value == 2 and all([(cards[i + 1].value - cards[i].value) == 1 for i in range(3)]):
-			is_straight = True		
-		elif all([(cards[i + 1].value - cards[i].value) == 1 for i in range(4)]):
-			is_straight = True
-
-
-		# Straight or Royal Flush
-		if n_suits == 1:
-			if is_straight and is_royal:			
-				return 'Royal flush'
-			elif is_straight:
-				return 'Straight flush'
-		elif is_straight:
-			return 'Straight'
-		
-
-		rank_counter = Counter([c.value for c in cards])		
-
-		if max(rank_counter.values()) == 4:
-			return 'Four of a kind'
-		elif max(rank_counter.values()) == 3 and min(rank_counter.values()) == 2:
-			return 'Full house'		
-		elif n_suits == 1:
-			return 'Flush'
-		elif max(rank_counter.values()) == 3:
-			return 'Three of a kind'
-		elif sum(v == 2 for s, v in rank_counter.items()) == 2:
-			return 'Two pair'
-		elif max(rank_counter.values()) == 2:
-			return 'Pair'
-		else:
-			return 'High card'
+		return CATEGORY[self.rank]
 
 
 	def __str__(self):
@@ -237,8 +184,7 @@ class PokerHand(object):
 
 	@staticmethod
 	def random_hand():
-		deck = PokerDeck()
-		return PokerHand([deck.pick() for _ in range(5)])
+		return PokerHand(random.sample(PokerCard.CARDS, 5))
 
 
 if __name__ == '__main__':
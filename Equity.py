@@ -0,0 +1,287 @@
+import random
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from Deck import PokerDeck, PokerCard
+from Evaluator import evaluate
+
+try:
+	import numpy as np
+	from BatchEvaluator import evaluate_ranks
+except ImportError:
+	np = None
+
+# default shard count for monte_carlo; fixed so a seed gives the same result on any number of workers
+SHARDS = 64
+# default chunk count for exact; fixed so the float share sums come out identical on any machine
+CHUNKS = 64
+
+
+class EquityTally(object):
+	def __init__(self, nseats):
+		self.samples = 0
+		self.wins = [0] * nseats
+		self.ties = [0] * nseats
+		self.losses = [0] * nseats
+		# pot share won per sample (1/k on a k-way split), and its square for the variance
+		self.shares = [0.0] * nseats
+		self.shares_sq = [0.0] * nseats
+		# set by exhaustive enumeration, where there is no sampling error
+		self.exact = False
+
+
+	def add(self, winners, nsplit):
+		self.samples+= 1
+		share = 1.0 / nsplit
+		for i in range(len(self.wins)):
+			if i in winners:
+				if nsplit == 1:
+					self.wins[i]+= 1
+				else:
+					self.ties[i]+= 1
+				self.shares[i]+= share
+				self.shares_sq[i]+= share * share
+			else:
+				self.losses[i]+= 1
+
+
+	def merge(self, other):
+		self.samples+= other.samples
+		self.exact = self.exact or other.exact
+		for i in range(len(self.wins)):
+			self.wins[i]+= other.wins[i]
+			self.ties[i]+= other.ties[i]
+			self.losses[i]+= other.losses[i]
+			self.shares[i]+= other.shares[i]
+			self.shares_sq[i]+= other.shares_sq[i]
+		return self
+
+
+	def equity(self, seat):
+		return self.shares[seat] / self.samples if self.samples else 0.0
+
+
+	def stderr(self, seat):
+		if self.exact or self.samples < 2:
+			return 0.0
+		mean = self.equity(seat)
+		var = max(self.shares_sq[seat] / self.samples - mean * mean, 0.0)
+		return math.sqrt(var / (self.samples - 1))
+
+
+	def __str__(self):
+		rows = []
+		for i in range(len(self.wins)):
+			rows.append('seat {}: win {} tie {} loss {} equity {:.4f} +- {:.4f}'.format(i, self.wins[i], self.ties[i], self.losses[i],
+																					self.equity(i), self.stderr(i)))
+		return '\n'.join(rows)
+
+
+def _check_cards(hands, board, n_opponents):
+	assert len(hands) > 0 and len(hands) + n_opponents >= 2, 'Equity needs at least two players'
+	assert all(len(h) == 2 for h in hands), 'Each known hand should have 2 cards'
+	assert len(board) <= 5, 'Board has at most 5 cards'
+	known = [c for h in hands for c in h] + list(board)
+	assert len(set(known)) == len(known), 'Duplicate cards'
+	assert len(known) + 2 * n_opponents + 5 - len(board) <= 52, 'Not enough cards for this many players'
+	return known
+
+
+def _sample(hands, board, n_opponents, samples, seed):
+	if np is not None:
+		return _sample_batch(hands, board, n_opponents, samples, seed)
+	deck = PokerDeck(random.Random(seed))
+	deck.remove(_check_cards(hands, board, n_opponents))
+	n_board = 5 - len(board)
+	need = n_board + 2 * n_opponents
+	nseats = len(hands)
+	tally = EquityTally(nseats)
+
+	for _ in range(samples):
+		deck.reset()
+		drawn = deck.deal(need)
+		full_board = board + drawn[:n_board]
+		strengths = [evaluate(h + full_board) for h in hands]
+		for i in range(n_board, need, 2):
+			strengths.append(evaluate(drawn[i:i + 2] + full_board))
+
+		# same rule as decide_winner: every best hand shares the pot
+		top = max(strengths)
+		nsplit = strengths.count(top)
+		tally.add([i for i in range(nseats) if strengths[i] == top], nsplit)
+
+	return tally
+
+
+def _sample_batch(hands, board, n_opponents, samples, seed, chunk=4096):
+	# _sample with numpy: chunk deals drawn at once, every hand of a chunk in one evaluate_ranks call
+	known = set(_check_cards(hands, board, n_opponents))
+	rng = np.random.default_rng(seed)
+	live = np.array([c for c in PokerCard.CARDS if c not in known], dtype=np.int64)
+	n_board = 5 - len(board)
+	need = n_board + 2 * n_opponents
+	nseats = len(hands)
+	nplayers = nseats + n_opponents
+	holes = np.array(hands, dtype=np.int64)
+	known_board = np.array(board, dtype=np.int64).reshape(1, len(board))
+	tally = EquityTally(nseats)
+	done = 0
+
+	while done < samples:
+		n = min(chunk, samples - done)
+		# need distinct undealt cards per deal: the smallest of n random keys per card
+		drawn = live[np.argpartition(rng.random((n, len(live))), need - 1, axis=1)[:, :need]]
+		full_board = np.concatenate([np.repeat(known_board, n, axis=0), drawn[:, :n_board]], axis=1)
+		rows = np.empty((nplayers, n, 7), dtype=np.int64)
+		rows[:nseats, :, :2] = holes[:, None, :]
+		for k in range(n_opponents):
+			rows[nseats + k, :, :2] = drawn[:, n_board + 2 * k:n_board + 2 * k + 2]
+		rows[:, :, 2:] = full_board[None, :, :]
+		ranks = evaluate_ranks(rows.reshape(-1, 7)).reshape(nplayers, n)
+
+		# same rule as decide_winner: every best hand shares the pot
+		top = ranks.max(axis=0)
+		nsplit = (ranks == top).sum(axis=0)
+		best = ranks[:nseats] == top
+		share = best / nsplit
+		tally.samples+= n
+		for i in range(nseats):
+			tally.wins[i]+= int((best[i] & (nsplit == 1)).sum())
+			tally.ties[i]+= int((best[i] & (nsplit > 1)).sum())
+			tally.losses[i]+= int(n - best[i].sum())
+			tally.shares[i]+= float(share[i].sum())
+			tally.shares_sq[i]+= float((share[i] * share[i]).sum())
+		done+= n
+
+	return tally
+
+
+def _unrank_combination(n, k, index):
+	# index-th k-combination of range(n) in itertools.combinations order
+	comb = []
+	x = 0
+	for i in range(k, 0, -1):
+		while True:
+			c = math.comb(n - x - 1, i - 1)
+			if index < c:
+				break
+			index-= c
+			x+= 1
+		comb.append(x)
+		x+= 1
+	return comb
+
+
+def _enumerate(hands, board, start, count):
+	known = set(_check_cards(hands, board, 0))
+	remaining = [c for c in PokerCard.CARDS if c not in known]
+	n = len(remaining)
+	k = 5 - len(board)
+	nseats = len(hands)
+	tally = EquityTally(nseats)
+	tally.exact = True
+	idx = _unrank_combination(n, k, start)
+
+	for _ in range(count):
+		full_board = board + [remaining[i] for i in idx]
+		strengths = [evaluate(h + full_board) for h in hands]
+		top = max(strengths)
+		nsplit = strengths.count(top)
+		tally.add([i for i in range(nseats) if strengths[i] == top], nsplit)
+
+		# next combination in lexicographic order
+		i = k - 1
+		while i >= 0 and idx[i] == n - k + i:
+			i-= 1
+		if i < 0:
+			break
+		idx[i]+= 1
+		for j in range(i + 1, k):
+			idx[j] = idx[j - 1] + 1
+
+	return tally
+
+
+def exact(hands, board=None, workers=None, chunks=None, executor=None):
+	# every remaining board for known hands only (heads-up: C(48, 5) boards preflop)
+	hands = [list(h) for h in hands]
+	board = list(board or [])
+	known = _check_cards(hands, board, 0)
+	workers = workers or os.cpu_count() or 1
+	total = math.comb(52 - len(known), 5 - len(board))
+	chunks = min(chunks or CHUNKS, total)
+	# contiguous ranges of the combination index, merged in order: depends on chunks, not on workers
+	bounds = [total * i // chunks for i in range(chunks + 1)]
+	ranges = [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(chunks)]
+
+	tally = EquityTally(len(hands))
+	tally.exact = True
+	if workers == 1 and executor is None:
+		for start, count in ranges:
+			tally.merge(_enumerate(hands, board, start, count))
+		return tally
+
+	pool = executor or ProcessPoolExecutor(max_workers=workers)
+	try:
+		futures = [pool.submit(_enumerate, hands, board, start, count) for start, count in ranges]
+		for f in futures:
+			tally.merge(f.result())
+	finally:
+		if executor is None:
+			pool.shutdown()
+	return tally
+
+
+def _shard_seeds(seed, shards):
+	master = random.Random(seed)
+	return [master.getrandbits(64) for _ in range(shards)]
+
+
+def monte_carlo(hands, board=None, n_opponents=0, samples=100000, workers=None, shards=None, seed=None, executor=None):
+	# hands: known hole cards, one [card, card] per seat; board: 0 to 5 known community cards
+	# n_opponents: players with unknown hole cards. Results are only reported for the known seats.
+	# Callers with many queries, like in-game advice, should create one ProcessPoolExecutor and
+	# pass it as executor: starting a pool (and numpy in each worker) per call costs more than a
+	# 1M-sample query itself.
+	hands = [list(h) for h in hands]
+	board = list(board or [])
+	_check_cards(hands, board, n_opponents)
+	workers = workers or os.cpu_count() or 1
+	# the shard count, not the worker count, fixes the random streams
+	shards = min(shards or SHARDS, samples)
+	seeds = _shard_seeds(seed, shards)
+	counts = [samples // shards + (1 if i < samples % shards else 0) for i in range(shards)]
+
+	tally = EquityTally(len(hands))
+	if workers == 1 and executor is None:
+		for n, s in zip(counts, seeds):
+			tally.merge(_sample(hands, board, n_opponents, n, s))
+		return tally
+
+	pool = executor or ProcessPoolExecutor(max_workers=workers)
+	try:
+		futures = [pool.submit(_sample, hands, board, n_opponents, n, s) for n, s in zip(counts, seeds)]
+		for f in futures:
+			tally.merge(f.result())
+	finally:
+		if executor is None:
+			pool.shutdown()
+	return tally
+
+
+if __name__ == '__main__':
+	import time
+	aces = [PokerCard(1, 'Spades'), PokerCard(1, 'Hearts')]
+	kings = [PokerCard(13, 'Spades'), PokerCard(13, 'Hearts')]
+	# one pool for every query, as the advice feature would keep it
+	with ProcessPoolExecutor() as pool:
+		monte_carlo([aces, kings], samples=1000, seed=1, executor=pool)
+		t = time.time()
+		tally = monte_carlo([aces, kings], samples=1000000, seed=1, executor=pool)
+		print(tally)
+		print('{} samples in {:.2f}s'.format(tally.samples, time.time() - t))
+
+	t = time.time()
+	tally = exact([aces, kings], board=[PokerCard(2, 'Clubs')])
+	print(tally)
+	print('{} boards in {:.2f}s'.format(tally.samples, time.time() - t))
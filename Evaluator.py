@@ -0,0 +1,241 @@
+from itertools import combinations
+
+# Lookup-table hand evaluator for packed cards (see Deck.Card).
+# A 5-card hand maps to a single strength in 1..7462, higher is better:
+# category and kickers compare with one integer comparison.
+
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+
+HIGH_CARD = 1
+PAIR = 1278
+TWO_PAIR = 4138
+THREE_OF_A_KIND = 4996
+STRAIGHT = 5854
+FLUSH = 5864
+FULL_HOUSE = 7141
+FOUR_OF_A_KIND = 7297
+STRAIGHT_FLUSH = 7453
+ROYAL_FLUSH = 7462
+MAX_STRENGTH = 7462
+
+# first strength of each category, lowest first
+CATEGORY_START = [(HIGH_CARD, 'High card'), (PAIR, 'Pair'), (TWO_PAIR, 'Two pair'), (THREE_OF_A_KIND, 'Three of a kind'),
+				(STRAIGHT, 'Straight'), (FLUSH, 'Flush'), (FULL_HOUSE, 'Full house'), (FOUR_OF_A_KIND, 'Four of a kind'),
+				(STRAIGHT_FLUSH, 'Straight flush'), (ROYAL_FLUSH, 'Royal flush')]
+
+# rank masks of the ten straights, wheel (A-2-3-4-5) first
+STRAIGHTS = [0x100F] + [0x1F << i for i in range(9)]
+
+# indexed by the 13-bit rank mask of five distinct ranks
+FLUSHES = [0] * 8192
+UNIQUE5 = [0] * 8192
+# indexed by the product of the five rank primes
+PRODUCTS = {}
+# indexed by strength
+CATEGORY = [None] * (MAX_STRENGTH + 1)
+# indexed by any 13-bit rank mask
+BITS = [bin(m).count('1') for m in range(8192)]
+# best straight inside a rank mask, 0 if none
+STRAIGHT_BEST = [0] * 8192
+# best five ranks of a single suit (straight flush or top five), 0 if fewer than five
+FLUSH_BEST = [0] * 8192
+# best strength of 6 or 7 unsuited cards, keyed by the product of their rank primes, filled lazily
+BEST_BY_PRODUCT = {}
+
+
+def _build_tables():
+	straights = set(STRAIGHTS)
+	distinct = sorted(sorted(r, reverse=True) for r in combinations(range(13), 5))
+	distinct = [r for r in distinct if sum(1 << x for x in r) not in straights]
+
+	def product(ranks):
+		p = 1
+		for r in ranks:
+			p*= PRIMES[r]
+		return p
+
+	for i, ranks in enumerate(distinct):
+		mask = sum(1 << r for r in ranks)
+		UNIQUE5[mask] = HIGH_CARD + i
+		FLUSHES[mask] = FLUSH + i
+
+	for i, mask in enumerate(STRAIGHTS):
+		UNIQUE5[mask] = STRAIGHT + i
+		FLUSHES[mask] = STRAIGHT_FLUSH + i
+
+	others = lambda used: [r for r in range(12, -1, -1) if r not in used]
+
+	# (start, list of rank tuples in ascending order)
+	paired = []
+
+	hands = []
+	for p in range(13):
+		for k in combinations(others([p]), 3):
+			hands.append((p, p) + k)
+	paired.append((PAIR, hands))
+
+	hands = []
+	for hi in range(13):
+		for lo in range(hi):
+			for k in others([hi, lo]):
+				hands.append((hi, hi, lo, lo, k))
+	paired.append((TWO_PAIR, hands))
+
+	hands = []
+	for t in range(13):
+		for k in combinations(others([t]), 2):
+			hands.append((t, t, t) + k)
+	paired.append((THREE_OF_A_KIND, hands))
+
+	hands = []
+	for t in range(13):
+		for p in others([t]):
+			hands.append((t, t, t, p, p))
+	paired.append((FULL_HOUSE, hands))
+
+	hands = []
+	for q in range(13):
+		for k in others([q]):
+			hands.append((q, q, q, q, k))
+	paired.append((FOUR_OF_A_KIND, hands))
+
+	for start, hands in paired:
+		for i, ranks in enumerate(sorted(hands)):
+			PRODUCTS[product(ranks)] = start + i
+
+	for i, (start, name) in enumerate(CATEGORY_START):
+		end = CATEGORY_START[i + 1][0] if i + 1 < len(CATEGORY_START) else MAX_STRENGTH + 1
+		for s in range(start, end):
+			CATEGORY[s] = name
+
+	for m in range(8192):
+		for st in reversed(STRAIGHTS):
+			if m & st == st:
+				STRAIGHT_BEST[m] = st
+				break
+		if BITS[m] >= 5:
+			if STRAIGHT_BEST[m]:
+				FLUSH_BEST[m] = STRAIGHT_BEST[m]
+			else:
+				top = m
+				while BITS[top] > 5:
+					top&= top - 1
+				FLUSH_BEST[m] = top
+
+_build_tables()
+
+
+def evaluate5(c0, c1, c2, c3, c4):
+	mask = (c0 | c1 | c2 | c3 | c4) >> 16
+	if c0 & c1 & c2 & c3 & c4 & 0xF000:
+		return FLUSHES[mask]
+	s = UNIQUE5[mask]
+	if s:
+		return s
+	return PRODUCTS[(c0 & 0xFF) * (c1 & 0xFF) * (c2 & 0xFF) * (c3 & 0xFF) * (c4 & 0xFF)]
+
+
+def category(strength):
+	return CATEGORY[strength]
+
+
+def _best_ranks(counts, rank_mask):
+	# five ranks (with repeats) of the best unsuited hand for the given rank counts
+	quads, trips, pairs, singles = [], [], [], []
+	for r in range(12, -1, -1):
+		n = counts[r]
+		if n == 4:
+			quads.append(r)
+		elif n == 3:
+			trips.append(r)
+		elif n == 2:
+			pairs.append(r)
+		elif n == 1:
+			singles.append(r)
+
+	if quads:
+		kicker = max(trips + pairs + singles + quads[1:])
+		return [quads[0]] * 4 + [kicker]
+	elif trips and (len(trips) > 1 or pairs):
+		pair = max(trips[1:] + pairs)
+		return [trips[0]] * 3 + [pair] * 2
+	elif STRAIGHT_BEST[rank_mask]:
+		st = STRAIGHT_BEST[rank_mask]
+		return [r for r in range(13) if st >> r & 1]
+	elif trips:
+		return [trips[0]] * 3 + singles[:2]
+	elif len(pairs) > 1:
+		kicker = max(pairs[2:] + singles[:1])
+		return [pairs[0]] * 2 + [pairs[1]] * 2 + [kicker]
+	elif pairs:
+		return [pairs[0]] * 2 + singles[:3]
+	return singles[:5]
+
+
+def _strength_of_ranks(ranks):
+	p = 1
+	mask = 0
+	for r in ranks:
+		p*= PRIMES[r]
+		mask|= 1 << r
+	if BITS[mask] == 5:
+		return UNIQUE5[mask]
+	return PRODUCTS[p]
+
+
+def evaluate(cards):
+	# strength of the best five out of 5 to 7 cards
+	if len(cards) == 5:
+		return evaluate5(*cards)
+
+	masks = [0] * 16
+	product = 1
+	for c in cards:
+		masks[(c >> 12) & 0xF]|= c >> 16
+		product*= c & 0xFF
+	return evaluate_masks(masks, product)
+
+
+def evaluate_masks(masks, product, counts=None):
+	# strength of 5 to 7 cards given as rank masks per suit bit (masks[1], [2], [4], [8]) and
+	# the product of their rank primes; counts per rank are derived from the masks if not given
+	for m in (masks[1], masks[2], masks[4], masks[8]):
+		if BITS[m] >= 5:
+			return FLUSHES[FLUSH_BEST[m]]
+
+	s = BEST_BY_PRODUCT.get(product)
+	if s is None:
+		rank_mask = masks[1] | masks[2] | masks[4] | masks[8]
+		if counts is None:
+			counts = [(masks[1] >> r & 1) + (masks[2] >> r & 1) + (masks[4] >> r & 1) + (masks[8] >> r & 1) for r in range(13)]
+		s = BEST_BY_PRODUCT[product] = _strength_of_ranks(_best_ranks(counts, rank_mask))
+	return s
+
+
+def best_hand(cards):
+	# (strength, chosen five cards) of the best five out of 5 to 7 cards
+	assert 5 <= len(cards) <= 7, 'Best hand needs 5 to 7 cards'
+	masks = [0] * 16
+	counts = [0] * 13
+	for c in cards:
+		masks[(c >> 12) & 0xF]|= c >> 16
+		counts[(c >> 8) & 0xF]+= 1
+
+	for suit in (1, 2, 4, 8):
+		m = masks[suit]
+		if BITS[m] >= 5:
+			five = FLUSH_BEST[m]
+			chosen = [c for c in cards if (c >> 12) & suit and (c >> 16) & five]
+			return FLUSHES[five], chosen
+
+	ranks = _best_ranks(counts, masks[1] | masks[2] | masks[4] | masks[8])
+	need = [0] * 13
+	for r in ranks:
+		need[r]+= 1
+	chosen = []
+	for c in cards:
+		r = (c >> 8) & 0xF
+		if need[r]:
+			need[r]-= 1
+			chosen.append(c)
+	return _strength_of_ranks(ranks), chosen
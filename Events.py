@@ -0,0 +1,138 @@
+from collections import namedtuple
+
+# Game events emitted by PokerMatch. Sinks receive plain arguments and decide
+# whether to build a record, format text or do nothing at all.
+NEW_HAND = 0
+DEAL = 1
+BLIND = 2
+CHECK = 3
+BET = 4
+CALL = 5
+RAISE = 6
+FOLD = 7
+BOARD = 8
+ROUND_END = 9
+SHOWDOWN = 10
+WIN = 11
+HAND_END = 12
+
+PREFLOP = 0
+FLOP = 1
+TURN = 2
+RIVER = 3
+STREETS = ['preflop', 'flop', 'turn', 'river']
+
+# seat is -1 and amount 0 when they don't apply; cards is a tuple or None
+Event = namedtuple('Event', 'kind street seat amount cards')
+
+
+def describe(kind, name, amount):
+	# history line of a player action
+	if kind == CHECK:
+		return '{} Checks'.format(name)
+	elif kind == BET:
+		return '{} bets {}'.format(name, amount)
+	elif kind == CALL:
+		return '{} Calls {}'.format(name, amount)
+	elif kind == RAISE:
+		return '{} raises to {}'.format(name, amount)
+	elif kind == FOLD:
+		return '{} folds'.format(name)
+
+
+class EventSink(object):
+	def attach(self, match):
+		self.match = match
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		raise NotImplementedError
+
+
+class NullSink(EventSink):
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		pass
+
+
+class BufferSink(EventSink):
+	def __init__(self):
+		self.events = []
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		self.events.append(Event(kind, street, seat, amount, cards))
+
+	def clear(self):
+		self.events = []
+
+
+class TeeSink(EventSink):
+	# forwards every event to several sinks
+	def __init__(self, *sinks):
+		self.sinks = sinks
+
+	def attach(self, match):
+		self.match = match
+		for s in self.sinks:
+			s.attach(match)
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		for s in self.sinks:
+			s.emit(kind, street, seat, amount, cards)
+
+
+class HistorySink(EventSink):
+	# builds the PokerMatch.history dict: action lines and pot per street, board cards per street
+	def __init__(self):
+		self.history = HistorySink.empty_history()
+
+	@staticmethod
+	def empty_history():
+		return {'preflop': [], 'flop': [], 'turn': [], 'river': [], 'community_cards': {'flop': [], 'turn': [], 'river': []}}
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		if kind == NEW_HAND:
+			self.history = HistorySink.empty_history()
+		elif CHECK <= kind <= FOLD:
+			self.history[STREETS[street]].append(describe(kind, self.match.players[seat].name, amount))
+		elif kind == BOARD:
+			self.history['community_cards'][STREETS[street]].extend(str(c) for c in cards)
+		elif kind == ROUND_END:
+			self.history[STREETS[street]].append(amount)
+
+
+class ConsoleSink(HistorySink):
+	def __init__(self, out=None):
+		super().__init__()
+		self.out = out
+
+	def write(self, *args):
+		print(*args, file=self.out)
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		super().emit(kind, street, seat, amount, cards)
+
+		if kind == NEW_HAND:
+			self.write('======' * 20)
+		elif CHECK <= kind <= FOLD:
+			self.write(self.history[STREETS[street]][-1])
+		elif kind == BOARD:
+			self.write('{}: Community cards:'.format(STREETS[street]))
+			self.write([str(c) for c in self.match.communityCards])
+		elif kind == ROUND_END:
+			self.write('Pot {}'.format(amount))
+		elif kind == SHOWDOWN:
+			self.write('{} cards:'.format(self.match.players[seat].name))
+			self.write([str(c) for c in cards])
+		elif kind == WIN:
+			self.write('Winner: {} ({})'.format(self.match.players[seat].name, amount))
+
+
+class FileSink(EventSink):
+	# one tab-separated line per event
+	def __init__(self, path):
+		self.f = open(path, 'w', buffering=1 << 16, encoding='utf-8')
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		self.f.write('{}\t{}\t{}\t{}\t{}\n'.format(kind, street, seat, amount, ' '.join(str(c) for c in cards) if cards else '-'))
+
+	def close(self):
+		self.f.close()
@@ -2,9 +2,10 @@ import sys
 import pygame
 import pygame.gfxdraw
 import time
-import math
+from Simulation import SimulationWorker, TableSnapshot
 
 class BorderedButton(object):
+    # the text surface is rendered once per color change, not once per frame
     def __init__(self, text, pos, font, color, padding, draw_border):        
         self.text = text
         self.pos = pos
@@ -18,6 +19,26 @@ class BorderedButton(object):
         self.text_obj = self.font.render(self.text, True, self.color)
         self.text_rect = self.text_obj.get_rect()
         self.text_rect.center = self.pos
+        p = self.padding
+        old = getattr(self, 'rect', None)
+        # area touched by render(), border included
+        if self.draw_border:
+            self.rect = pygame.Rect(self.text_rect.x - p, self.text_rect.y - p, self.text_rect.width + 4*p, self.text_rect.height + 4*p)
+        else:
+            self.rect = self.text_rect.copy()
+        # to repaint on the next frame, the old area too when the text shrank
+        self.dirty_rect = self.rect.union(old) if old is not None else self.rect
+        self.dirty = True
+
+    def set_text(self, text):
+        if text != self.text:
+            self.text = text
+            self.create()
+
+    def set_color(self, color):
+        if color != self.color:
+            self.color = color
+            self.create()
 
     def get_bottom_y(self):
         return self.text_rect.y + self.text_rect.height
@@ -30,11 +51,12 @@ class BorderedButton(object):
         px = 2*self.padding
         py = 2*self.padding
 
-        self.create()
         context.blit(self.text_obj, self.text_rect)        
 
         if self.draw_border:
             pygame.draw.rect(context, self.color, [x - self.padding, y - self.padding, w + 2*px, h + 2*py], 2)
+        self.dirty = False
+        return self.rect
 
 
 class PlayerHUD(object):
@@ -49,22 +71,47 @@ class PlayerHUD(object):
 		self.text = []
 		self.labels = []
 		self.padding = padding
+		self.surface = None
+		self.rect = pygame.Rect(int(pos[0]), int(pos[1]), size[0], size[1])
+		self.dirty = True
 
 
 	def set_text(self, text):
-		self.text = text
+		# labels and the HUD surface are only rebuilt when the text changes
+		if text == self.text:
+			return
+		self.text = list(text)
 		self.labels = []
 		self.labels.append(self.font.render(self.text[0], True, self.stackColor))
 		self.labels.append(self.font.render(self.text[1], True, self.actionColor))
-		
+		self.build()
 
-	def render(self, context):
-		pygame.draw.rect(context, self.stackColor, (self.pos[0] , self.pos[1], self.size[0], self.size[1]), 2)
-		y = self.pos[1]
 
-		for i in range(len(self.labels)):
-			lb = self.labels[i]
-			context.blit(lb, (self.padding[0] + self.pos[0], self.padding[1] + y + i * self.fontSize, self.size[0], self.size[1]))
+	def build(self):
+		x, y = int(self.pos[0]), int(self.pos[1])
+		rect = pygame.Rect(x, y, self.size[0], self.size[1])
+		offsets = []
+		for i, lb in enumerate(self.labels):
+			lb_rect = lb.get_rect(topleft=(self.padding[0] + x, self.padding[1] + y + i * self.fontSize))
+			offsets.append(lb_rect)
+			rect.union_ip(lb_rect)
+
+		self.surface = pygame.Surface(rect.size, pygame.SRCALPHA)
+		pygame.draw.rect(self.surface, self.stackColor, (x - rect.x, y - rect.y, self.size[0], self.size[1]), 2)
+		for lb, lb_rect in zip(self.labels, offsets):
+			self.surface.blit(lb, lb_rect.move(-rect.x, -rect.y))
+		# the old area has to be repainted too if the HUD shrank
+		self.dirty_rect = rect.union(self.rect)
+		self.rect = rect
+		self.dirty = True
+
+
+	def render(self, context):
+		if self.surface is None:
+			self.build()
+		context.blit(self.surface, self.rect)
+		self.dirty = False
+		return self.rect
 
 
 class SceneManager(object):
@@ -75,6 +122,7 @@ class SceneManager(object):
 	def go_to(self, scene):
 		self.scene = scene
 		self.scene.manager = self
+		self.scene.invalidate()
 
 
 class Scene(object):
@@ -82,8 +130,14 @@ class Scene(object):
 		self.size = size
 		self.width = size[0]
 		self.height = size[1]
+		self.redraw = True
+
+	def invalidate(self):
+		# repaint everything on the next frame, e.g. when the scene is shown
+		self.redraw = True
 
 	def render(self, display):
+		# draws what changed and returns the dirty rects for display.update()
 		raise NotImplementedError
 
 	def update(self):
@@ -94,7 +148,8 @@ class Scene(object):
 
 
 class PokerTable(Scene):
-	def __init__(self, size, nplayers):
+	# shows the game a SimulationWorker plays; only the snapshot is read while rendering
+	def __init__(self, size, nplayers, worker=None):
 		super().__init__(size)
 		self.font = pygame.font.SysFont(pygame.font.get_default_font(), 24)
 		self.nplayers = nplayers
@@ -146,23 +201,61 @@ class PokerTable(Scene):
 				hud = PlayerHUD(None, self.positions[i], (self.hud_w, self.hud_h), self.font, 24, (255, 255, 0), (255, 255, 255), (5, 5))
 				hud.set_text(['P{}: $1000'.format(i), 'folded'])
 				self.huds.append(hud)
+
+		self.worker = worker
+		self.snapshot = TableSnapshot(nplayers)
+		self.board_label = BorderedButton(' ', (self.width/2, self.height/2), self.font, (255, 255, 255), 2, False)
+		self.build_background()
 			
 
+	def build_background(self):
+		# table felt and outline never change, draw them once
+		self.background = pygame.Surface(self.size).convert()
+		self.background.fill((0, 150, 0))
+		pygame.gfxdraw.aaellipse(self.background, int(self.width/2), int(self.height/2), int(self.table_w/2), int(self.table_h/2), (255, 255, 255))
+
+
 	def render(self, display):
-		PI = math.pi
-		display.fill((0, 150, 0))
-		pygame.gfxdraw.aaellipse(display, int(self.width/2), int(self.height/2), int(self.table_w/2), int(self.table_h/2), (255, 255, 255))		
-		
-		for h in self.huds:
-			h.render(display)
+		if self.redraw:
+			display.blit(self.background, (0, 0))
+			for h in self.huds:
+				h.render(display)
+			self.board_label.render(display)
+			self.redraw = False
+			return [display.get_rect()]
+
+		rects = []
+		for w in self.huds + [self.board_label]:
+			if w.dirty:
+				area = w.dirty_rect
+				display.blit(self.background, area, area)
+				w.render(display)
+				rects.append(area)
+		return rects
 
 
 
 	def update(self):
-		pass
+		# engine events since the last frame; widgets only re-render what they show differently
+		if self.worker is None:
+			return
+		snapshot = self.snapshot
+		for e in self.worker.poll():
+			snapshot.apply(e)
+		for seat in snapshot.take_changes():
+			self.huds[seat].set_text(snapshot.hud_text(seat))
+		if snapshot.board_changed:
+			self.board_label.set_text(snapshot.board_text())
+			snapshot.board_changed = False
+
+	def stop(self):
+		if self.worker is not None:
+			self.worker.stop()
+			self.worker = None
 
 	def handle_event(self, event):
 		if event.type == pygame.MOUSEBUTTONDOWN:
+			self.stop()
 			self.manager.go_to(self.manager.controller.scenes[0])
 			
 
@@ -192,6 +285,10 @@ class MenuScene(Scene):
 		self.button7 = BorderedButton('7 Players', (self.width/2, 40 + bottom_y_btn), self.fontButton, MenuScene.BTN_COLOR, 3, True)
 		bottom_y_btn = self.button7.get_bottom_y()
 		self.button8 = BorderedButton('8 Players', (self.width/2, 40 + bottom_y_btn), self.fontButton, MenuScene.BTN_COLOR, 3, True)
+		self.buttons = [self.button3, self.button4, self.button5, self.button6, self.button7, self.button8]
+
+		self.background = pygame.Surface(self.size).convert()
+		self.background.fill(MenuScene.BG_COLOR)
 
 
 	@staticmethod
@@ -199,35 +296,43 @@ class MenuScene(Scene):
 		return rect.x < px < rect.x + rect.width and rect.y < py < rect.y + rect.height
 
 	def render(self, display):
-		display.fill(MenuScene.BG_COLOR)
-		self.title.render(display)
-		self.button3.render(display)
-		self.button4.render(display)
-		self.button5.render(display)
-		self.button6.render(display)
-		self.button7.render(display)
-		self.button8.render(display)
+		if self.redraw:
+			display.blit(self.background, (0, 0))
+			self.title.render(display)
+			for btn in self.buttons:
+				btn.render(display)
+			self.redraw = False
+			return [display.get_rect()]
+
+		rects = []
+		for btn in self.buttons:
+			if btn.dirty:
+				display.blit(self.background, btn.dirty_rect, btn.dirty_rect)
+				btn.render(display)
+				rects.append(btn.dirty_rect)
+		return rects
 
 	def update(self):
 		pass
 
 	def handle_event(self, event):
-		mouse = pygame.mouse.get_pos()
+		# mouse events carry their position, which also works for scripted events
+		mouse = getattr(event, 'pos', None) or pygame.mouse.get_pos()
 		x = mouse[0]
 		y = mouse[1]
 		selected = None
 
-		for btn in [self.button3, self.button4, self.button5, self.button6, self.button7, self.button8]:
+		for btn in self.buttons:
 			if MenuScene.point_inside_rect(x, y, btn.text_rect):
-				btn.color = MenuScene.BTN_HOVER_COLOR
+				btn.set_color(MenuScene.BTN_HOVER_COLOR)
 				selected = btn
 			else:
-				btn.color = MenuScene.BTN_COLOR
+				btn.set_color(MenuScene.BTN_COLOR)
 
 		if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and selected is not None:
 			print('Inside menu selected {}'.format(selected.text))
 			nplayers = int(selected.text[0])
-			table = PokerTable(size, nplayers)
+			table = PokerTable(self.size, nplayers, SimulationWorker(nplayers).start())
 			#self.manager.go_to(self.manager.controller.scenes[1])
 			self.manager.go_to(table)
 
@@ -239,7 +344,7 @@ class GameViewController(object):
 		self.running = False
 		self.manager = SceneManager(self)
 		pygame.init()
-		self.display = pygame.display.set_mode(self.size, pygame.HWSURFACE | pygame.DOUBLEBUF)
+		self.display = pygame.display.set_mode(self.size)
 		
 
 	def add_scene(self, scene):
@@ -250,28 +355,29 @@ class GameViewController(object):
 		self.manager.go_to(self.scenes[0])
 		timer = pygame.time.Clock()
 		self.running = True
-		prev_time = time.time()
+		caption_time = time.time()
 
 		while self.running:
-			timer.tick(60)			
+			# the only frame pacing; the engine runs in its own worker
+			timer.tick(60)
 
 			for event in pygame.event.get():
 				if event.type == pygame.QUIT:
 					self.running = False
+					if hasattr(self.manager.scene, 'stop'):
+						self.manager.scene.stop()
 					return
 				self.manager.scene.handle_event(event)
 
 			self.manager.scene.update()
-			self.manager.scene.render(self.display)
-			pygame.display.flip()
-
-			curr_time = time.time()
-			diff = curr_time - prev_time
-			delay = max(1.0/60 - diff, 0)
-			time.sleep(delay)			
-			prev_time = curr_time
-			fps = 1.0/(delay + diff)
-			pygame.display.set_caption('{}: {:.2f}'.format('FPS', fps))
+			rects = self.manager.scene.render(self.display)
+			if rects:
+				pygame.display.update(rects)
+
+			now = time.time()
+			if now - caption_time >= 1.0:
+				caption_time = now
+				pygame.display.set_caption('{}: {:.2f}'.format('FPS', timer.get_fps()))
 
 
 
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from Deck import PokerCard
+from Evaluator import best_hand
+
+# LRU cache of best-hand results. Hands that differ only by a renaming of suits have the
+# same strength and the same chosen ranks, so the key is the card set with suits put in
+# a canonical order: the four per-suit rank masks, sorted. Chosen cards are stored as
+# (rank, canonical suit) and mapped back to the caller's suits on a hit.
+
+# suit bit (1, 2, 4, 8) -> suit index, as a list for the hit path
+SUIT_BIT_IDX = [PokerCard.SUIT_BIT_IDX.get(bit, 0) for bit in range(16)]
+
+
+class BestHandCache(object):
+	def __init__(self, maxsize=1 << 16):
+		assert maxsize > 0, 'Cache size should be positive'
+		self.maxsize = maxsize
+		self.data = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+	def best_hand(self, cards):
+		# same result as Evaluator.best_hand: (strength, chosen five cards)
+		masks = [0] * 16
+		for c in cards:
+			masks[(c >> 12) & 0xF]|= c >> 16
+		# suit bits in canonical order, richest mask first
+		order = sorted((1, 2, 4, 8), key=masks.__getitem__, reverse=True)
+		key = (masks[order[0]], masks[order[1]], masks[order[2]], masks[order[3]])
+
+		data = self.data
+		entry = data.get(key)
+		if entry is not None:
+			self.hits+= 1
+			data.move_to_end(key)
+			strength, chosen = entry
+			cards = PokerCard.CARDS
+			return strength, [cards[r * 4 + SUIT_BIT_IDX[order[slot]]] for r, slot in chosen]
+
+		self.misses+= 1
+		strength, five = best_hand(cards)
+		data[key] = (strength, [((c >> 8) & 0xF, order.index((c >> 12) & 0xF)) for c in five])
+		if len(data) > self.maxsize:
+			data.popitem(last=False)
+			self.evictions+= 1
+		return strength, five
+
+
+	def resize(self, maxsize):
+		assert maxsize > 0, 'Cache size should be positive'
+		self.maxsize = maxsize
+		while len(self.data) > maxsize:
+			self.data.popitem(last=False)
+			self.evictions+= 1
+
+
+	def clear(self):
+		self.data.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		return {'size': len(self.data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+				'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+	def __len__(self):
+		return len(self.data)
+
+
+	def __str__(self):
+		return '{size}/{maxsize} entries, {hits} hits, {misses} misses, {evictions} evictions, hit rate {hit_rate:.3f}'.format(**self.stats())
+
+
+class LockedBestHandCache(BestHandCache):
+	# for caches shared between threads; process pools get a cache per worker anyway
+	def __init__(self, maxsize=1 << 16):
+		super().__init__(maxsize)
+		self.lock = threading.Lock()
+
+
+	def best_hand(self, cards):
+		with self.lock:
+			return super().best_hand(cards)
+
+
+	def resize(self, maxsize):
+		with self.lock:
+			super().resize(maxsize)
+
+
+	def clear(self):
+		with self.lock:
+			super().clear()
+
+
+	def stats(self):
+		with self.lock:
+			return super().stats()
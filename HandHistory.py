@@ -0,0 +1,456 @@
+import mmap
+import struct
+from Deck import PokerCard, Card
+from Events import *
+from PokerMatch import PokerMatch, PokerPlayer, SeatRing
+
+# Compact binary hand histories.
+#
+# File:    magic b'PKHH', version (uint32), small blind and big blind (uint16 each), then
+#          hands back to back.
+# Hand:    header <BBH: number of seats, button << 3 | board cards, number of actions
+#          cards: the hole cards (2 per seat) then the board, 6 bits each (63 if unknown),
+#                 packed into whole bytes, first card in the low bits
+#          actions: 4 bits each, two per byte, first action in the low nibble
+# Action codes are the Events constants CHECK, BET, CALL, RAISE, FOLD and WIN, plus BOARD
+# where the next street's cards were dealt and EXT, which gives the amount of the next
+# action in the four nibbles after it. Seats and amounts are mostly implied: blinds follow
+# the button, players act in table order (BettingOrder), a call pays what is owed, a bet
+# is one big blind, a raise goes one big blind over the current bet and a win takes what
+# is left of the pot. Only WIN carries a seat, in the nibble after it. Anything else, such
+# as a split pot share, goes through EXT. 6-8 seat hands of AIPlayer self-play take
+# 26-33 bytes.
+
+MAGIC = b'PKHH'
+VERSION = 2
+FILE_HEADER = struct.Struct('<4sI')
+BLINDS = struct.Struct('<HH')
+HAND_HEADER = struct.Struct('<BBH')
+
+# Side index (path + '.idx'): magic b'PKHI', version, then one entry per hand:
+#   offset, size, showdown seat mask, winner seat mask, final pot, seats, button, board cards
+INDEX_MAGIC = b'PKHI'
+INDEX_ENTRY = struct.Struct('<QIHHIBBBx')
+EXT = 15
+NO_CARD = 63
+MAX_SEATS = 16
+MAX_AMOUNT = 0xFFFF
+
+RECORD_KINDS = (BLIND, CHECK, BET, CALL, RAISE, FOLD, BOARD, WIN)
+# board cards seen so far -> street
+CARD_STREET = [PREFLOP, FLOP, FLOP, FLOP, TURN, RIVER]
+
+
+def _pack_cards(cards):
+	bits = 0
+	for i, c in enumerate(cards):
+		bits|= c << (6 * i)
+	return bits.to_bytes((6 * len(cards) + 7) // 8, 'little')
+
+
+class BettingOrder(object):
+	# Seat to act and default amounts along a hand, as PokerMatch plays it: blinds left of
+	# the button, then table order skipping folded seats, each street opening left of the
+	# button. Amounts are street totals for bets and raises, chips added for calls.
+	def __init__(self, nplayers, button, small_blind, big_blind):
+		self.ring = SeatRing(nplayers)
+		self.button = button
+		self.big_blind = big_blind
+		sb = self.ring.succ[button]
+		bb = self.ring.succ[sb]
+		self.blinds = sorted([(sb, small_blind), (bb, big_blind)])
+		self.bets = [0] * nplayers
+		self.bets[sb] = small_blind
+		self.bets[bb] = big_blind
+		self.current = big_blind
+		# seat to act
+		self.seat = self.ring.next(bb)
+		# chips put in so far, and won so far
+		self.pot = small_blind + big_blind
+		self.won = 0
+
+
+	def default(self, kind):
+		if kind == CALL:
+			return self.current - self.bets[self.seat]
+		elif kind == RAISE:
+			return self.current + self.big_blind
+		elif kind == BET:
+			return self.big_blind
+		elif kind == WIN:
+			return self.pot - self.won
+		return 0
+
+
+	def play(self, kind, amount):
+		# returns the seat that acted
+		seat = self.seat
+		if kind == BET or kind == RAISE:
+			self.pot+= amount - self.bets[seat]
+			self.bets[seat] = amount
+			self.current = amount
+		elif kind == CALL:
+			self.pot+= amount
+			self.bets[seat]+= amount
+		elif kind == FOLD:
+			self.ring.remove(seat)
+		self.seat = self.ring.next(seat)
+		return seat
+
+
+	def next_street(self):
+		self.bets = [0] * len(self.bets)
+		self.current = 0
+		self.seat = self.ring.next(self.button)
+
+
+class HandRecord(object):
+	def __init__(self, nplayers, button, nboard, cards, actions, nactions, blinds=(1, 2)):
+		self.nplayers = nplayers
+		self.button = button
+		self.nboard = nboard
+		# packed 6-bit cards, hole cards then board
+		self.cards = cards
+		# packed 4-bit action codes
+		self.actions = actions
+		self.nactions = nactions
+		self.blinds = blinds
+
+
+	def card_indices(self):
+		bits = int.from_bytes(self.cards, 'little')
+		return [(bits >> (6 * i)) & 0x3F for i in range(2 * self.nplayers + self.nboard)]
+
+
+	def hole_cards(self, seat):
+		bits = int.from_bytes(self.cards, 'little') >> (12 * seat)
+		a, b = bits & 0x3F, (bits >> 6) & 0x3F
+		if a == NO_CARD:
+			return None
+		return (PokerCard.from_index(a), PokerCard.from_index(b))
+
+
+	def codes(self):
+		return [b >> shift & 0xF for b in self.actions for shift in (0, 4)][:self.nactions]
+
+
+	def records(self):
+		# lazily decoded (kind, street, seat, value); seat is -1 for board cards
+		order = BettingOrder(self.nplayers, self.button, *self.blinds)
+		for seat, amount in order.blinds:
+			yield BLIND, PREFLOP, seat, amount
+		board = self.card_indices()[2 * self.nplayers:]
+		nboard = 0
+		codes = iter(self.codes())
+		amount = None
+		for code in codes:
+			if code == EXT:
+				amount = 0
+				for k in range(4):
+					amount|= next(codes) << (4 * k)
+				continue
+			if code == BOARD:
+				street = CARD_STREET[nboard + 1]
+				for v in board[nboard:nboard + (3 if nboard == 0 else 1)]:
+					nboard+= 1
+					yield BOARD, street, -1, v
+				order.next_street()
+				continue
+			if amount is None:
+				amount = order.default(code)
+			if code == WIN:
+				seat = next(codes)
+				order.won+= amount
+			else:
+				seat = order.play(code, amount)
+			yield code, CARD_STREET[nboard], seat, amount
+			amount = None
+
+
+	def board(self):
+		return [PokerCard.from_index(v) for v in self.card_indices()[2 * self.nplayers:]]
+
+
+	def encode(self):
+		return HAND_HEADER.pack(self.nplayers, self.button << 3 | self.nboard, self.nactions) + bytes(self.cards) + bytes(self.actions)
+
+
+class HandEncoder(object):
+	# builds a HandRecord from records given in table order, as PokerMatch emits them
+	def __init__(self, nplayers, button, small_blind=1, big_blind=2):
+		assert nplayers <= MAX_SEATS, 'At most {} seats per hand'.format(MAX_SEATS)
+		self.nplayers = nplayers
+		self.button = button
+		self.blinds = (small_blind, big_blind)
+		self.order = BettingOrder(nplayers, button, small_blind, big_blind)
+		self.hole = [NO_CARD] * (2 * nplayers)
+		self.board = []
+		self.codes = []
+
+
+	def deal(self, seat, cards):
+		self.hole[2 * seat] = cards[0].index
+		self.hole[2 * seat + 1] = cards[1].index
+
+
+	def add(self, kind, seat, value):
+		order = self.order
+		if kind == BLIND:
+			assert (seat, value) in order.blinds, 'Blind of {} from seat {} does not follow the button'.format(value, seat)
+			return
+		if kind == BOARD:
+			if len(self.board) in (0, 3, 4):
+				self.codes.append(BOARD)
+				order.next_street()
+			self.board.append(value)
+			return
+
+		codes = self.codes
+		if value != order.default(kind):
+			assert 0 <= value <= MAX_AMOUNT, 'Amount out of range: {}'.format(value)
+			codes.extend((EXT, value & 0xF, (value >> 4) & 0xF, (value >> 8) & 0xF, value >> 12))
+		if kind == WIN:
+			codes.append(WIN)
+			codes.append(seat)
+			order.won+= value
+		else:
+			assert seat == order.seat, 'Seat {} acted out of turn'.format(seat)
+			codes.append(kind)
+			order.play(kind, value)
+
+
+	def hand(self):
+		codes = self.codes
+		actions = bytes(codes[i] | (codes[i + 1] << 4 if i + 1 < len(codes) else 0) for i in range(0, len(codes), 2))
+		return HandRecord(self.nplayers, self.button, len(self.board), _pack_cards(self.hole + self.board), actions,
+						len(codes), self.blinds)
+
+
+class HistoryWriter(EventSink):
+	# streams each hand to disk when it completes, and its index entry to path + '.idx'
+	def __init__(self, path, buffering=1 << 20, index=True, small_blind=1, big_blind=2):
+		self.f = open(path, 'wb', buffering=buffering)
+		self.f.write(FILE_HEADER.pack(MAGIC, VERSION) + BLINDS.pack(small_blind, big_blind))
+		self.offset = FILE_HEADER.size + BLINDS.size
+		self.blinds = (small_blind, big_blind)
+		self.idx = None
+		if index:
+			self.idx = open(path + '.idx', 'wb', buffering=buffering)
+			self.idx.write(FILE_HEADER.pack(INDEX_MAGIC, VERSION))
+		self.encoder = None
+		self.hands = 0
+
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		if kind == NEW_HAND:
+			self.encoder = HandEncoder(self.match.nplayers, self.match.button_idx, *self.blinds)
+			self.showdown_mask = 0
+			self.winner_mask = 0
+			self.nboard = 0
+		elif kind == DEAL:
+			self.encoder.deal(seat, cards)
+		elif kind == BOARD:
+			for c in cards:
+				self.encoder.add(BOARD, 0, c.index)
+			self.nboard+= len(cards)
+		elif kind in RECORD_KINDS:
+			self.encoder.add(kind, seat, amount)
+			if kind == WIN:
+				self.winner_mask|= 1 << seat
+		elif kind == SHOWDOWN:
+			self.showdown_mask|= 1 << seat
+		elif kind == HAND_END:
+			self.write_hand(self.encoder.hand(), self.showdown_mask, self.winner_mask, amount, self.nboard)
+			self.encoder = None
+
+
+	def write_hand(self, hand, showdown_mask=0, winner_mask=0, pot=0, nboard=0):
+		data = hand.encode()
+		self.f.write(data)
+		if self.idx is not None:
+			self.idx.write(INDEX_ENTRY.pack(self.offset, len(data), showdown_mask, winner_mask, pot, hand.nplayers, hand.button, nboard))
+		self.offset+= len(data)
+		self.hands+= 1
+
+
+	def close(self):
+		self.f.close()
+		if self.idx is not None:
+			self.idx.close()
+
+
+def _read_hand(header, read, blinds):
+	# HandRecord from a packed header and a read(n) for the bytes after it
+	nplayers, packed, nactions = header
+	button, nboard = packed >> 3, packed & 7
+	cards = read((6 * (2 * nplayers + nboard) + 7) // 8)
+	actions = read((nactions + 1) // 2)
+	return HandRecord(nplayers, button, nboard, cards, actions, nactions, blinds)
+
+
+def read_hands(path):
+	# generator over the hands of a file, one HandRecord at a time
+	with open(path, 'rb') as f:
+		magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+		assert magic == MAGIC and version == VERSION, 'Not a hand history file: {}'.format(path)
+		blinds = BLINDS.unpack(f.read(BLINDS.size))
+		while True:
+			header = f.read(HAND_HEADER.size)
+			if len(header) < HAND_HEADER.size:
+				return
+			yield _read_hand(HAND_HEADER.unpack(header), f.read, blinds)
+
+
+def to_dict(hand, names):
+	# the PokerMatch.history layout, with names[seat] as player names
+	history = HistorySink.empty_history()
+	street = PREFLOP
+	pot = 0
+	street_bets = [0] * hand.nplayers
+
+	for kind, rec_street, seat, value in hand.records():
+		if rec_street != street:
+			# pot at the end of each street played
+			pot+= sum(street_bets)
+			history[STREETS[street]].append(pot)
+			street = rec_street
+			street_bets = [0] * hand.nplayers
+
+		if kind == BOARD:
+			history['community_cards'][STREETS[street]].append(str(PokerCard.from_index(value)))
+		elif kind == BLIND or kind == BET or kind == RAISE:
+			# totals for the street
+			street_bets[seat] = value
+		elif kind == CALL:
+			street_bets[seat]+= value
+
+		if CHECK <= kind <= FOLD:
+			history[STREETS[street]].append(describe(kind, names[seat], value))
+
+	history[STREETS[street]].append(pot + sum(street_bets))
+	return history
+
+
+def parse_card(text):
+	value = {v: k for k, v in Card.VALUE_STR.items()}[text[:-1]]
+	suit = {v: k for k, v in Card.SUIT_STR.items()}[text[-1]]
+	return PokerCard(value, suit)
+
+
+def from_dict(history, names, button=0, small_blind=1):
+	# hole cards are not in the dict and stay unknown; blinds follow PokerMatch's seating
+	n = len(names)
+	seats = {name: i for i, name in enumerate(names)}
+	enc = HandEncoder(n, button, small_blind, 2 * small_blind)
+	enc.add(BLIND, (button + 1) % n, small_blind)
+	enc.add(BLIND, (button + 2) % n, 2 * small_blind)
+	verbs = [(' Checks', CHECK), (' bets ', BET), (' Calls ', CALL), (' raises to ', RAISE), (' folds', FOLD)]
+
+	for street in STREETS:
+		if street != 'preflop':
+			for text in history['community_cards'][street]:
+				enc.add(BOARD, 0, parse_card(text).index)
+		for line in history[street]:
+			if not isinstance(line, str):
+				continue
+			for verb, kind in verbs:
+				name, sep, amount = line.rpartition(verb)
+				if sep and name in seats:
+					enc.add(kind, seats[name], int(amount) if amount else 0)
+					break
+	return enc.hand()
+
+
+class HistoryStore(object):
+	# random access to an indexed history file through mmap
+	def __init__(self, path):
+		with open(path, 'rb') as f:
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		with open(path + '.idx', 'rb') as f:
+			self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version = FILE_HEADER.unpack_from(self.data, 0)
+		assert magic == MAGIC and version == VERSION, 'Not a hand history file: {}'.format(path)
+		self.blinds = BLINDS.unpack_from(self.data, FILE_HEADER.size)
+		magic, version = FILE_HEADER.unpack_from(self.index, 0)
+		assert magic == INDEX_MAGIC and version == VERSION, 'Not a hand history index: {}.idx'.format(path)
+		self.nhands = (len(self.index) - FILE_HEADER.size) // INDEX_ENTRY.size
+
+
+	def __len__(self):
+		return self.nhands
+
+
+	def entry(self, n):
+		# (offset, size, showdown mask, winner mask, pot, seats, button, board cards)
+		if n < 0:
+			n+= self.nhands
+		assert 0 <= n < self.nhands, 'No hand {}'.format(n)
+		return INDEX_ENTRY.unpack_from(self.index, FILE_HEADER.size + n * INDEX_ENTRY.size)
+
+
+	def hand(self, n):
+		offset, size = self.entry(n)[:2]
+		view = memoryview(self.data)[offset:offset + size]
+		pos = [HAND_HEADER.size]
+		def read(n):
+			start = pos[0]
+			pos[0]+= n
+			return view[start:start + n]
+		return _read_hand(HAND_HEADER.unpack_from(view, 0), read, self.blinds)
+
+
+	def entries(self):
+		return INDEX_ENTRY.iter_unpack(memoryview(self.index)[FILE_HEADER.size:])
+
+
+	def showdown_hands(self, seat):
+		# hand numbers where seat went to showdown, read from the index only
+		bit = 1 << seat
+		return [n for n, e in enumerate(self.entries()) if e[2] & bit]
+
+
+	def won_hands(self, seat):
+		bit = 1 << seat
+		return [n for n, e in enumerate(self.entries()) if e[3] & bit]
+
+
+	def replay(self, n, actions=None, names=None):
+		# PokerMatch as it stood after the first `actions` records of hand n (all of them by default).
+		# Nothing is asked of the players; pot counts every chip put in so far.
+		hand = self.hand(n)
+		names = names or ['P{}'.format(i) for i in range(hand.nplayers)]
+		match = PokerMatch([PokerPlayer(name) for name in names], sink=NullSink())
+		match.button_idx = hand.button
+		match.sb_idx = (hand.button + 1) % hand.nplayers
+		match.bb_idx = (hand.button + 2) % hand.nplayers
+		for seat, p in enumerate(match.players):
+			cards = hand.hole_cards(seat)
+			p.cards = list(cards) if cards else []
+
+		street = PREFLOP
+		street_bets = [0] * hand.nplayers
+		for i, (kind, rec_street, seat, value) in enumerate(hand.records()):
+			if actions is not None and i >= actions:
+				break
+			if rec_street != street:
+				match.pot+= sum(street_bets)
+				street_bets = [0] * hand.nplayers
+				street = rec_street
+
+			if kind == BOARD:
+				match.communityCards.append(PokerCard.from_index(value))
+			elif kind == BLIND or kind == BET or kind == RAISE:
+				street_bets[seat] = value
+			elif kind == CALL:
+				street_bets[seat]+= value
+			elif kind == FOLD:
+				match.players[seat].is_out = True
+				match.ring.remove(seat)
+
+		match.pot+= sum(street_bets)
+		return match
+
+
+	def close(self):
+		self.data.close()
+		self.index.close()
@@ -0,0 +1,214 @@
+from Deck import PokerCard
+from Evaluator import CATEGORY, CATEGORY_START, evaluate, evaluate_masks
+from Events import *
+import PreflopTable
+
+try:
+	import numpy as np
+	from BatchEvaluator import evaluate_ranks
+except ImportError:
+	np = None
+
+# Incremental hand state for one player. add() folds a board card into per-suit rank
+# masks, the rank-prime product and rank counts in O(1); strength, outs and the
+# strength/potential metrics are computed from that state on first use and cached
+# until the next card arrives. Queries that have no meaning yet (or any more) answer
+# empty rather than raise: no outs or potential before the flop or on the river, and
+# preflop hand strength is the PreflopTable equity, or None without a table that covers it.
+
+CATEGORY_RANK = {name: i for i, (_, name) in enumerate(CATEGORY_START)}
+
+
+class HandTracker(object):
+	def __init__(self, hole, board=()):
+		self.hole = list(hole)
+		self.board = []
+		# per suit bit (1, 2, 4, 8): rank mask of the cards seen
+		self.masks = [0] * 16
+		self.product = 1
+		self.counts = [0] * 13
+		# card index bits of every known card
+		self.known = 0
+		for c in self.hole:
+			self.fold(c)
+		for c in board:
+			self.add(c)
+		self.clear()
+
+
+	def fold(self, card):
+		self.masks[(card >> 12) & 0xF]|= card >> 16
+		self.product*= card & 0xFF
+		self.counts[(card >> 8) & 0xF]+= 1
+		self.known|= 1 << card.index
+
+
+	def add(self, card):
+		self.board.append(card)
+		self.fold(card)
+		self.clear()
+
+
+	def clear(self):
+		self._strength = None
+		self._next = None
+		self._hs = None
+		self._potential = None
+
+
+	@property
+	def strength(self):
+		# 0 before the flop
+		if self._strength is None:
+			self._strength = evaluate_masks(self.masks, self.product, self.counts) if self.board else 0
+		return self._strength
+
+
+	def category(self):
+		if not self.board:
+			return 'Pair' if self.hole[0].rank == self.hole[1].rank else 'High card'
+		return CATEGORY[self.strength]
+
+
+	def unseen(self):
+		known = self.known
+		return [c for c in PokerCard.CARDS if not known >> c.index & 1]
+
+
+	def next_strengths(self):
+		# (card, strength with that card) for every unseen card; empty before the flop and on the river
+		if self._next is None:
+			if not 3 <= len(self.board) < 5:
+				self._next = []
+				return self._next
+			masks = self.masks
+			counts = self.counts
+			out = []
+			for c in self.unseen():
+				suit = (c >> 12) & 0xF
+				r = (c >> 8) & 0xF
+				old = masks[suit]
+				masks[suit]|= c >> 16
+				counts[r]+= 1
+				out.append((c, evaluate_masks(masks, self.product * (c & 0xFF), counts)))
+				masks[suit] = old
+				counts[r]-= 1
+			self._next = out
+		return self._next
+
+
+	def outs(self):
+		# category name -> unseen cards that make exactly that category, for categories above the current one
+		current = CATEGORY_RANK[self.category()]
+		outs = {}
+		for c, s in self.next_strengths():
+			name = CATEGORY[s]
+			if CATEGORY_RANK[name] > current:
+				outs.setdefault(name, []).append(c)
+		return outs
+
+
+	def hand_strength(self, opponents=1):
+		# share of opponent hole cards beaten now (ties count half), against random hands.
+		# Preflop: equity vs that many random hands from the preflop table, None if it can't say
+		if not self.board:
+			table = PreflopTable.TABLE
+			if table is None or opponents > table.max_opponents:
+				return None
+			return table.equity(self.hole[0], self.hole[1], opponents)
+		if self._hs is None:
+			mine = self.strength
+			board = self.board
+			ahead = tied = total = 0
+			unseen = self.unseen()
+			for i, a in enumerate(unseen):
+				for b in unseen[i + 1:]:
+					s = evaluate([a, b] + board)
+					if s < mine:
+						ahead+= 1
+					elif s == mine:
+						tied+= 1
+					total+= 1
+			self._hs = (ahead + 0.5 * tied) / total
+		return self._hs ** opponents
+
+
+	def potential(self):
+		# (positive, negative) potential over the next card: the chance to go from behind to
+		# ahead, and from ahead to behind, against one random hand. Ties count half. (0, 0)
+		# before the flop and on the river.
+		if self._potential is None:
+			if not 3 <= len(self.board) < 5:
+				self._potential = (0.0, 0.0)
+				return self._potential
+			unseen = self.unseen()
+			nexts = self.next_strengths()
+			opp = [(a, b) for i, a in enumerate(unseen) for b in unseen[i + 1:]]
+			now = self.opponent_strengths(opp, [])
+			mine = self.strength
+			# [now ahead / tied / behind][later ahead / tied / behind]
+			table = [[0.0] * 3 for _ in range(3)]
+			for c, later_mine in nexts:
+				later = self.opponent_strengths(opp, [c])
+				for (a, b), s0, s1 in zip(opp, now, later):
+					if a == c or b == c:
+						continue
+					i = 0 if mine > s0 else 1 if mine == s0 else 2
+					j = 0 if later_mine > s1 else 1 if later_mine == s1 else 2
+					table[i][j]+= 1
+			behind = sum(table[2]) + sum(table[1]) / 2
+			ahead = sum(table[0]) + sum(table[1]) / 2
+			ppot = (table[2][0] + table[2][1] / 2 + table[1][0] / 2) / behind if behind else 0.0
+			npot = (table[0][2] + table[0][1] / 2 + table[1][2] / 2) / ahead if ahead else 0.0
+			self._potential = (ppot, npot)
+		return self._potential
+
+
+	def opponent_strengths(self, opp, extra):
+		board = self.board + extra
+		if np is not None:
+			rows = np.array([[a, b] + board for a, b in opp], dtype=np.int64)
+			return evaluate_ranks(rows).tolist()
+		return [evaluate([a, b] + board) for a, b in opp]
+
+
+	def effective_strength(self, opponents=1):
+		# EHS = HS * (1 - NPot) + (1 - HS) * PPot; plain hand strength preflop (maybe None) and on the river
+		hs = self.hand_strength(opponents)
+		if hs is None:
+			return None
+		ppot, npot = self.potential()
+		return hs * (1 - npot) + (1 - hs) * ppot
+
+
+class TrackerSink(EventSink):
+	# keeps a HandTracker per seat in step with the match; combine with other sinks through TeeSink
+	def __init__(self):
+		self.trackers = []
+
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		if kind == NEW_HAND:
+			self.trackers = [None] * self.match.nplayers
+		elif kind == DEAL:
+			self.trackers[seat] = HandTracker(cards)
+		elif kind == BOARD:
+			for t in self.trackers:
+				for c in cards:
+					t.add(c)
+
+
+if __name__ == '__main__':
+	import time
+	from Range import parse_card
+	t = HandTracker([parse_card('Ah'), parse_card('Kh')])
+	for text in ('Qh', '7h', '2c'):
+		t.add(parse_card(text))
+	start = time.time()
+	print(t.category(), {k: [str(c) for c in v] for k, v in t.outs().items()})
+	print('HS {:.3f}'.format(t.hand_strength()), 'PPot/NPot {:.3f}/{:.3f}'.format(*t.potential()),
+		'EHS {:.3f}'.format(t.effective_strength()), '{:.3f}s'.format(time.time() - start))
+	start = time.time()
+	for _ in range(1000):
+		t.outs(), t.hand_strength(), t.effective_strength()
+	print('cached queries: {:.2f}us'.format((time.time() - start) * 1000))
@@ -1,12 +1,15 @@
 from Deck import *
+from Evaluator import best_hand, evaluate
+from Events import *
 from random import choice
-import itertools
 
 class PokerPlayer(object):
 	def __init__(self, name):
 		self.name=name
 		self.is_out = False
 		self.cards = []
+		# set by PokerMatch, lets a player read match.state when asked to act
+		self.match = None
 
 	def act(self, options):		
 		pass		
@@ -43,33 +46,242 @@ class HumanPlayer(PokerPlayer):
 				print('Invalid action, try again:')
 				print(options)
 
-	
+
+class SeatRing(object):
+	# active seats as a circular doubly linked list over seat indices
+	def __init__(self, nseats):
+		self.nseats = nseats
+		# fixed seating order, also used to rotate the button and blinds
+		self.succ = [(i + 1) % nseats for i in range(nseats)]
+		self.reset()
+
+
+	def reset(self):
+		n = self.nseats
+		self.nxt = list(self.succ)
+		self.prv = [(i - 1) % n for i in range(n)]
+		self.active = [True] * n
+		self.count = n
+
+
+	def next(self, seat):
+		# first active seat after seat, which may itself have been removed
+		seat = self.nxt[seat]
+		while not self.active[seat]:
+			seat = self.nxt[seat]
+		return seat
+
+
+	def prev(self, seat):
+		seat = self.prv[seat]
+		while not self.active[seat]:
+			seat = self.prv[seat]
+		return seat
+
+
+	def remove(self, seat):
+		# removed seats keep their links, so next()/prev() still work from them
+		assert self.active[seat] and self.count > 1, 'SeatRing remove error'
+		p = self.prv[seat]
+		n = self.nxt[seat]
+		self.nxt[p] = n
+		self.prv[n] = p
+		self.active[seat] = False
+		self.count-= 1
+
+
+	def seats(self, start=0):
+		# active seats in order, starting from start if active or the next one after it
+		seat = start if self.active[start] else self.next(start)
+		for _ in range(self.count):
+			yield seat
+			seat = self.nxt[seat]
+
+
+	def copy(self):
+		ring = SeatRing.__new__(SeatRing)
+		ring.nseats = self.nseats
+		ring.succ = self.succ
+		ring.nxt = self.nxt[:]
+		ring.prv = self.prv[:]
+		ring.active = self.active[:]
+		ring.count = self.count
+		return ring
+
+
+# options offered to players, shared between calls: don't mutate them
+CHECK_RAISE = ['check', 'raise']
+CHECK_ONLY = ['check']
+CALL_RAISE_FOLD = ['call', 'raise', 'fold']
+CALL_FOLD = ['call', 'fold']
+BET_CHECK = ['bet', 'check']
+
+
+class GameState(object):
+	# Betting state of one hand: everything PokerMatch needs to run the action,
+	# in flat lists so a decision point can be cloned and explored.
+	__slots__ = ('ring', 'button', 'big_blind', 'max_raises', 'street', 'board', 'hole', 'pot', 'contributed',
+				'current_bet', 'n_raises', 'to_act', 'end_round', 'round_over', 'hand_over')
+
+	def __init__(self, ring, button, sb, bb, small_blind, big_blind, max_raises, hole=None):
+		self.ring = ring
+		self.button = button
+		self.big_blind = big_blind
+		self.max_raises = max_raises
+		self.street = PREFLOP
+		self.board = ()
+		# hole cards per seat, shared by clones
+		self.hole = hole
+		# chips from finished streets
+		self.pot = 0
+		self.contributed = [0] * ring.nseats
+		self.contributed[sb] = small_blind
+		self.contributed[bb] = big_blind
+		self.current_bet = big_blind
+		self.n_raises = 0
+		self.to_act = ring.next(bb)
+		# seat that can close the round
+		self.end_round = bb
+		self.round_over = False
+		self.hand_over = False
+
+
+	def clone(self):
+		s = GameState.__new__(GameState)
+		s.ring = self.ring.copy()
+		s.button = self.button
+		s.big_blind = self.big_blind
+		s.max_raises = self.max_raises
+		s.street = self.street
+		s.board = self.board
+		s.hole = self.hole
+		s.pot = self.pot
+		s.contributed = self.contributed[:]
+		s.current_bet = self.current_bet
+		s.n_raises = self.n_raises
+		s.to_act = self.to_act
+		s.end_round = self.end_round
+		s.round_over = self.round_over
+		s.hand_over = self.hand_over
+		return s
+
+
+	def legal_actions(self):
+		if self.round_over:
+			return []
+		elif self.current_bet is None:
+			return BET_CHECK
+		elif self.contributed[self.to_act] == self.current_bet:
+			return CHECK_RAISE if self.n_raises < self.max_raises else CHECK_ONLY
+		return CALL_RAISE_FOLD if self.n_raises < self.max_raises else CALL_FOLD
+
+
+	def apply(self, action):
+		# plays action for the seat to act; returns the event (kind, amount)
+		seat = self.to_act
+		ring = self.ring
+		contributed = self.contributed
+
+		if action == 'check':
+			kind, amount = CHECK, 0
+		elif action == 'bet':
+			self.current_bet = self.big_blind
+			contributed[seat]+= self.big_blind
+			self.end_round = ring.prev(seat)
+			kind, amount = BET, self.big_blind
+		elif action == 'call':
+			amount = self.current_bet - contributed[seat]
+			contributed[seat]+= amount
+			kind = CALL
+		elif action == 'raise':
+			self.n_raises+= 1
+			self.current_bet+= self.big_blind
+			contributed[seat] = self.current_bet
+			self.end_round = ring.prev(seat)
+			kind, amount = RAISE, self.current_bet
+		elif action == 'fold':
+			ring.remove(seat)
+			kind, amount = FOLD, 0
+		else:
+			raise ValueError('Unknown action: {}'.format(action))
+
+		if ring.count == 1:
+			self.end_street()
+			self.hand_over = True
+		elif seat == self.end_round:
+			self.end_street()
+			self.hand_over = self.street == RIVER
+		else:
+			self.to_act = ring.next(seat)
+		return kind, amount
+
+
+	def child(self, action):
+		s = self.clone()
+		s.apply(action)
+		return s
+
+
+	def end_street(self):
+		self.pot+= sum(self.contributed)
+		self.round_over = True
+
+
+	def next_street(self, cards):
+		# deal the next street's board cards and open its betting round
+		self.street+= 1
+		self.board = self.board + tuple(cards)
+		self.contributed = [0] * self.ring.nseats
+		self.current_bet = None
+		self.n_raises = 0
+		self.to_act = self.ring.next(self.button)
+		self.end_round = self.ring.prev(self.to_act)
+		self.round_over = False
+
+
+	def total_pot(self):
+		return self.pot + (0 if self.round_over else sum(self.contributed))
+
+
 class PokerMatch(object):
-	def __init__(self, players):
+	def __init__(self, players, sink=None, rng=None):
 		self.nplayers = len(players)
 		self.button_idx = 0
 		self.sb_idx = 1
 		self.bb_idx = 2		
 		self.players = players#[PokerPlayer('player' + str(i)) for i in range(nplayers)]
+		for p in players:
+			p.match = self
 		self.smallBlind = 1
 		self.bigBlind = 2 * self.smallBlind
 		self.pot = 0
-		self.deck = PokerDeck()
+		self.deck = PokerDeck(rng)
+		self.ring = SeatRing(self.nplayers)
+		self.state = None
+		# MatchStats while instrumented (see Profiling)
+		self.stats = None
 		self.communityCards = []
-		self.history = {'preflop': [], 'flop': [], 'turn': [], 'river': [], 'community_cards': {'flop': [], 'turn': [], 'river': []}}
+		# console output and the history dict by default, NullSink for headless runs
+		self.sink = sink if sink is not None else ConsoleSink()
+		self.sink.attach(self)
 		PokerMatch.MAX_RAISES = 4
 
 
+	@property
+	def history(self):
+		return getattr(self.sink, 'history', None)
+
+
 	def rotate(self):
-		self.button_idx = (self.button_idx + 1) % self.nplayers
-		self.sb_idx = (self.sb_idx + 1) % self.nplayers
-		self.bb_idx = (self.bb_idx + 1) % self.nplayers
+		self.button_idx = self.ring.succ[self.button_idx]
+		self.sb_idx = self.ring.succ[self.sb_idx]
+		self.bb_idx = self.ring.succ[self.bb_idx]
 
 		# reset
+		self.ring.reset()
 		self.pot = 0
-		self.deck = PokerDeck()
+		self.deck.reset()
 		self.communityCards = []
-		self.history = {'preflop': [], 'flop': [], 'turn': [], 'river': [], 'community_cards': {'flop': [], 'turn': [], 'river': []}}
 
 		for p in self.players:
 			p.is_out = False
@@ -77,210 +289,87 @@ class PokerMatch(object):
 
 
 
-	# def get_player_to_left(self, player):
-	# 	idx = self.players.index(player)
-	# 	next_idx = (idx + 1) % self.nplayers
-	# 	return self.players[next_idx]
-
 	# next player
 	def get_player_to_left(self, player):
-		tmp = player
-		while True:
-			idx = self.players.index(player)
-			next_idx = (idx + 1) % self.nplayers
-			player = self.players[next_idx]
-
-			if not player.is_out:
-				assert player != tmp, 'get_player_to_left error'
-				return next_idx, player
+		next_idx = self.ring.next(self.players.index(player))
+		return next_idx, self.players[next_idx]
 
 
 	# player before
 	def get_player_to_right(self, player):
-		tmp = player
-		while True:
-			idx = self.players.index(player)
-			next_idx = idx - 1 if idx > 0 else self.nplayers - 1
-			player = self.players[next_idx]
-
-			if not player.is_out:
-				assert player != tmp, 'get_player_to_right error'
-				return next_idx, player
+		next_idx = self.ring.prev(self.players.index(player))
+		return next_idx, self.players[next_idx]
 
 
 
 	def preflop(self):
-		done = False				
-		_, currentPlayer = self.get_player_to_left(self.players[self.bb_idx])		
-		current_bet = self.bigBlind
-		folded = 0  
-		contributed = []
-
-		# player cards
-		for _ in range(2):
-			for p in self.players:
-				p.cards.append(self.deck.pick())
-
-		# blinds
-		for i in range(self.nplayers):
-			if i == self.sb_idx:
-				contributed.append(self.smallBlind)
-			elif i == self.bb_idx:
-				contributed.append(self.bigBlind)
-			else:
-				contributed.append(0)
-
-
-		# idx of player that can close the round
-		end_round_idx = self.bb_idx
-		n_raises = 0
-
-		while not done:
-			p_idx = self.players.index(currentPlayer)			
-			
-			if contributed[p_idx] == current_bet:				
-				act = currentPlayer.act(['check', 'raise'] if n_raises < PokerMatch.MAX_RAISES else ['check'])
-
-				if act == 'raise':
-					n_raises+= 1
-					amount_raise = 1 * self.bigBlind
-					raise_to = current_bet + amount_raise
-					current_bet = raise_to
-					contributed[p_idx]+= amount_raise					
-					end_round_idx, _ = self.get_player_to_right(currentPlayer)
-					str_log = '{} raises to {}'.format(currentPlayer.name, raise_to)
-					print(str_log)
-					print('Pot {}'.format(sum(contributed)))
-					self.history['preflop'].append(str_log)					
-				elif act =='check':
-					str_log = '{} Checks'.format(currentPlayer.name)
-					print(str_log)
-					self.history['preflop'].append(str_log)					
-			else:
-				amount_call = current_bet - contributed[p_idx]
-				act = currentPlayer.act(['call', 'raise', 'fold'] if n_raises < PokerMatch.MAX_RAISES else ['call', 'fold'])
-
-				if act == 'call':
-					contributed[p_idx]+= amount_call
-					str_log = '{} Calls {}'.format(currentPlayer.name, amount_call)
-					print(str_log)
-					print('Pot {}'.format(sum(contributed)))
-					self.history['preflop'].append(str_log)					
-				elif act == 'raise':
-					n_raises+= 1					
-					amount_raise = 1 * self.bigBlind
-					raise_to = current_bet + amount_raise
-					current_bet = raise_to
-					contributed[p_idx]+= amount_call + amount_raise					
-					end_round_idx, _ = self.get_player_to_right(currentPlayer)
-					str_log = '{} raises to {}'.format(currentPlayer.name, raise_to)					
-					print(str_log)
-					print('Pot {}'.format(sum(contributed)))
-					self.history['preflop'].append(str_log)					
-				elif act == 'fold':
-					currentPlayer.is_out = True
-					folded+= 1
-					str_log = '{} folds'.format(currentPlayer.name)
-					print(str_log)
-					self.history['preflop'].append(str_log)					
-
-
-			if folded == self.nplayers - 1:
-				# exiting round, updating pot size
-				self.pot+= sum(contributed)
-				self.history['preflop'].append(self.pot)
-				return [p for p in self.players if not p.is_out], contributed
-						
-			if p_idx == end_round_idx:
-				done = True				
-			else:
-				_, currentPlayer = self.get_player_to_left(currentPlayer)
+		self.deal_hand()
+		return self.betting_round()
 
-		# exiting round, updating pot size
-		self.pot+= sum(contributed)
-		self.history['preflop'].append(self.pot)
-		return [p for p in self.players if not p.is_out], contributed
+
+
+	def deal_hand(self):
+		sink = self.sink
+		sink.emit(NEW_HAND, PREFLOP)
+
+		# player cards, one round of the table at a time: seat i gets cards i and n + i
+		players = self.players
+		n = len(players)
+		cards = self.deck.deal(2 * n)
+		holes = list(zip(cards[:n], cards[n:]))
+		for i, p in enumerate(players):
+			p.cards = list(holes[i])
+			sink.emit(DEAL, PREFLOP, i, 0, holes[i])
+
+		self.state = GameState(self.ring, self.button_idx, self.sb_idx, self.bb_idx, self.smallBlind, self.bigBlind,
+							PokerMatch.MAX_RAISES, holes)
+		# blinds, in seat order
+		for i in sorted((self.sb_idx, self.bb_idx)):
+			sink.emit(BLIND, PREFLOP, i, self.state.contributed[i])
 
 
 
 	def flop(self, cc, round_name):
-		done = False				
-		_, currentPlayer = self.get_player_to_left(self.players[self.button_idx])
-		current_bet = None
-		folded = 0  
-		contributed = [0] * self.nplayers
-
-		# idx of player that can close the round
-		end_round_idx, _ = self.get_player_to_right(currentPlayer)
-		n_raises = 0
-
-		# community cards
-		for i in range(cc):
-			card = self.deck.pick()
-			self.communityCards.append(card)
-			self.history['community_cards'][round_name].append(str(card))
-
-		print('{}: Community cards:'.format(round_name))
-		print([str(c) for c in self.communityCards])
-
-		while not done:
-			p_idx = self.players.index(currentPlayer)			
-			
-			if current_bet is None:
-				act = currentPlayer.act(['bet', 'check'])
-
-				if act == 'bet':										
-					current_bet = self.bigBlind
-					contributed[p_idx]+= current_bet
-					end_round_idx, _ = self.get_player_to_right(currentPlayer)
-					str_log = '{} bets {}'.format(currentPlayer.name, current_bet)
-					print(str_log)
-					self.history[round_name].append(str_log)					
-				elif act =='check':
-					str_log = '{} Checks'.format(currentPlayer.name)
-					print(str_log)
-					self.history[round_name].append(str_log)					
-			else:
-				amount_call = current_bet - contributed[p_idx]
-				act = currentPlayer.act(['call', 'raise', 'fold'] if n_raises < PokerMatch.MAX_RAISES else ['call', 'fold'])
-
-				if act == 'call':
-					contributed[p_idx]+= amount_call
-					str_log = '{} Calls {}'.format(currentPlayer.name, amount_call)
-					print(str_log)
-					self.history[round_name].append(str_log)					
-				elif act == 'raise':
-					n_raises+= 1					
-					amount_raise = 1 * self.bigBlind
-					raise_to = current_bet + amount_raise
-					current_bet = raise_to
-					contributed[p_idx]+= amount_call + amount_raise					
-					end_round_idx, _ = self.get_player_to_right(currentPlayer)
-					str_log = '{} raises to {}'.format(currentPlayer.name, raise_to)
-					print(str_log)
-					self.history[round_name].append(str_log)					
-				elif act == 'fold':
-					currentPlayer.is_out = True
-					folded+= 1
-					str_log = '{} folds'.format(currentPlayer.name)
-					print(str_log)
-					self.history[round_name].append(str_log)					
-
-
-			if folded == self.nplayers - 1:
-				# exiting round, updating pot size
-				self.pot+= sum(contributed)
-				self.history[round_name].append(self.pot)
-				return [p for p in self.players if not p.is_out], contributed
-						
-			if p_idx == end_round_idx:
-				done = True				
-			else:
-				_, currentPlayer = self.get_player_to_left(currentPlayer)
+		self.deal_street(cc)
+		return self.betting_round()
+
+
+
+	def deal_street(self, cc):
+		cards = self.deck.deal(cc)
+		self.communityCards.extend(cards)
+		self.state.next_street(cards)
+		self.sink.emit(BOARD, self.state.street, -1, 0, tuple(cards))
+
+
+
+	def betting_round(self):
+		state = self.state
+		players = self.players
+
+		while not state.round_over:
+			p_idx = state.to_act
+			self.apply_action(p_idx, players[p_idx].act(state.legal_actions()))
+		return self.end_round()
+
+
+
+	def apply_action(self, p_idx, act):
+		state = self.state
+		street = state.street
+		kind, amount = state.apply(act)
+		if kind == FOLD:
+			self.players[p_idx].is_out = True
+		self.sink.emit(kind, street, p_idx, amount)
 
+
+
+	def end_round(self):
 		# exiting round, updating pot size
-		self.pot+= sum(contributed)
-		self.history[round_name].append(self.pot)
+		state = self.state
+		contributed = state.contributed
+		self.pot = state.pot
+		self.sink.emit(ROUND_END, state.street, -1, self.pot)
 		return [p for p in self.players if not p.is_out], contributed
 
 
@@ -293,96 +382,108 @@ class PokerMatch(object):
 		return self.flop(cc=1, round_name='river')
 
 
-def get_strongest_hand(player, community_cards):	
-	combs = list(itertools.combinations(player.cards + community_cards, 5))
-	hand_values = []
-	hands = []
+	def showdown(self):
+		# active players from the seat left of the button, for the odd-chip rule
+		start = self.button_idx + 1
+		players = [p for p in self.players[start:] + self.players[:start] if not p.is_out]
+		return showdown(players, self.communityCards, self.pot)
 
-	for c in combs:
-		hand = PokerHand(c)
-		hands.append(hand)
-		hand_type = hand.classify()		
-		hand_values.append(PokerHand.hand_value[hand_type])
-		
-	max_val = max(hand_values)
-	tied_hands = [hands[i] for i in range(len(hand_values)) if hand_values[i] == max_val]	
 
-	if len(tied_hands) == 1:
-		return tied_hands
-	else:
-		combs = list(itertools.combinations(tied_hands, 2))
-		wins = {}
+	# plays one hand to the end, call rotate() before the next one
+	def play_hand(self):
+		players, _ = self.preflop()
+		street = PREFLOP
 
-		for a, b in combs:
-			winner = a.get_winner(b)
-			wins[str(a)] = wins.get(str(a), 0) + winner
-			wins[str(b)] = wins.get(str(b), 0) - winner
+		for next_street, cc in ((FLOP, 3), (TURN, 1), (RIVER, 1)):
+			if len(players) == 1:
+				break
+			street = next_street
+			players, _ = self.flop(cc, STREETS[street])
 
-		max_val = max(wins.values())
-		best = [h for h in tied_hands if wins[str(h)] == max_val]
-		return best
+		return self.finish_hand(players, street)
 
 
-def decide_winner(players, community_cards):
-	strongest_hand = [get_strongest_hand(p, community_cards)[0] for p in players]	
-	combs = list(itertools.combinations(strongest_hand, 2))
-	wins = {}
+	def finish_hand(self, players, street):
+		# showdown or uncontested pot, once the last betting round is over
+		sink = self.sink
+		if len(players) > 1:
+			result = self.showdown()
+			for p in result.players:
+				sink.emit(SHOWDOWN, street, self.players.index(p), 0, tuple(p.cards))
+			winners = result.winners
+			for p, share in zip(result.players, result.shares):
+				if p in winners:
+					sink.emit(WIN, street, self.players.index(p), share)
+		else:
+			winners = players
+			sink.emit(WIN, street, self.players.index(players[0]), self.pot)
+
+		sink.emit(HAND_END, street, -1, self.pot)
+		return winners
+
+
+class ShowdownResult(object):
+	def __init__(self, players, strengths, winners, shares):
+		self.players = players
+		# best 5-card strength per player (Evaluator scale, higher is better)
+		self.strengths = strengths
+		self.winners = winners
+		# chips won per player, aligned with players
+		self.shares = shares
+		self._places = None
+
+
+	@property
+	def places(self):
+		# 1 for the best hand, tied hands share a place. Sorts the distinct strengths, so it
+		# is worked out on first use: settling the pot does not need it.
+		if self._places is None:
+			place_of = {s: i + 1 for i, s in enumerate(sorted(set(self.strengths), reverse=True))}
+			self._places = [place_of[s] for s in self.strengths]
+		return self._places
+
+
+	def ranking(self):
+		return [p for _, p in sorted(zip(self.places, self.players), key=lambda x: x[0])]
+
+
+def showdown(players, community_cards, pot=0):
+	# players in seat order starting left of the button: odd chips go to the first winners in that order
+	strengths = [evaluate(p.cards + community_cards) for p in players]
+	top = max(strengths)
+	winners = [p for p, s in zip(players, strengths) if s == top]
+
+	share, odd = divmod(pot, len(winners))
+	shares = []
+	for s in strengths:
+		if s == top:
+			shares.append(share + (1 if odd > 0 else 0))
+			odd-= 1
+		else:
+			shares.append(0)
+	return ShowdownResult(players, strengths, winners, shares)
+
+
+# Optional HandCache.BestHandCache in front of best_hand, shared by every match (use the
+# locked variant if matches run in threads). Off by default: a miss costs more than an
+# uncached call, so it only pays when the same spots come back often.
+best_hand_cache = None
 
-	for a, b in combs:
-		winner = a.get_winner(b)
-		wins[str(a)] = wins.get(str(a), 0) + winner
-		wins[str(b)] = wins.get(str(b), 0) - winner
 
-	max_val = max(wins.values())
-	winning_hands = [h for h in strongest_hand if wins[str(h)] == max_val]
+def get_strongest_hand(player, community_cards):
+	cards = player.cards + community_cards
+	_, cards = best_hand(cards) if best_hand_cache is None else best_hand_cache.best_hand(cards)
+	return [PokerHand(cards)]
 
-	winners = [players[i] for i, hand in enumerate(strongest_hand) if hand in winning_hands]
-	return winners
+
+def decide_winner(players, community_cards):
+	return showdown(players, community_cards).winners
 
 
 if __name__ == '__main__':
 	match = PokerMatch([HumanPlayer('Fernando Mir'), AIPlayer('AI-1'), AIPlayer('AI-2')])
 
 	for _ in range(100):
-		print('======'*20)
-		players, x = match.preflop()
-		
-		if len(players) > 1:			
-			players, x = match.flop(3, 'flop')
-		else:
-			print('Winner: {}'.format(players[0].name))
-			match.rotate()
-			continue
-						
-		if len(players) > 1:			
-			players, x = match.turn()
-		else:
-			print('Winner: {}'.format(players[0].name))
-			match.rotate()
-			continue		
-						
-		if len(players) > 1:			
-			players, x = match.river()
-
-			if len(players) > 1:
-				winners = decide_winner(match.players, match.communityCards)								
-
-				for p in match.players:
-					print('{} cards:'.format(p.name))
-					print([str(c) for c in p.cards])
-
-				print('Winners:')
-				print([str(winner) for winner in winners])
-			else:
-				print('Winner: {}'.format(players[0].name))
-				match.rotate()
-				continue
-		else:
-			print('Winner: {}'.format(players[0].name))
-			match.rotate()
-			continue
-
-							
+		match.play_hand()
 		print(match.history)
-		match.rotate()		
-	
+		match.rotate()
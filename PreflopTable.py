@@ -0,0 +1,152 @@
+import os
+import mmap
+import random
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from Deck import PokerDeck, PokerCard
+from Evaluator import evaluate
+import Equity
+
+# Preflop equity for the 169 canonical starting hands, built once by `python PreflopTable.py`
+# and memory-mapped at import. Classes live on a 13x13 grid of ranks (0 = deuce .. 12 = ace):
+# pairs on the diagonal, suited hands at [high][low], offsuit hands at [low][high].
+#
+# File layout (native byte order):
+#   header: magic b'PFEQ', version, samples per entry, max opponents (4 x uint32)
+#   vs_random: float32[169][MAX_OPPONENTS]  equity vs 1..MAX_OPPONENTS random hands
+#   heads_up:  float32[169][169]            equity of class i vs class j
+
+MAGIC = b'PFEQ'
+VERSION = 1
+MAX_OPPONENTS = 7
+NCLASSES = 169
+HEADER = struct.Struct('=4sIII')
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_equity.bin')
+
+
+def hand_class(c1, c2):
+	r1 = (c1 >> 8) & 0xF
+	r2 = (c2 >> 8) & 0xF
+	hi, lo = (r1, r2) if r1 >= r2 else (r2, r1)
+	if c1 & c2 & 0xF000:
+		return hi * 13 + lo
+	return lo * 13 + hi
+
+
+def class_name(idx):
+	names = '23456789TJQKA'
+	a, b = divmod(idx, 13)
+	if a == b:
+		return names[a] * 2
+	elif a > b:
+		return names[a] + names[b] + 's'
+	return names[b] + names[a] + 'o'
+
+
+def class_combos(idx):
+	return [(c1, c2) for i, c1 in enumerate(PokerCard.CARDS) for c2 in PokerCard.CARDS[i + 1:] if hand_class(c1, c2) == idx]
+
+
+class PreflopTable(object):
+	def __init__(self, buf, samples, max_opponents):
+		self.buf = buf
+		self.samples = samples
+		self.max_opponents = max_opponents
+		floats = memoryview(buf)[HEADER.size:].cast('f')
+		n = NCLASSES * max_opponents
+		self.vs_random = floats[:n]
+		self.heads_up_matrix = floats[n:n + NCLASSES * NCLASSES]
+
+
+	@staticmethod
+	def load(path=DEFAULT_PATH):
+		with open(path, 'rb') as f:
+			buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, samples, max_opponents = HEADER.unpack_from(buf, 0)
+		assert magic == MAGIC and version == VERSION, 'Not a preflop equity table: {}'.format(path)
+		return PreflopTable(buf, samples, max_opponents)
+
+
+	def equity(self, c1, c2, opponents=1):
+		assert 1 <= opponents <= self.max_opponents, 'Opponents should be between 1 and {}'.format(self.max_opponents)
+		return self.vs_random[hand_class(c1, c2) * self.max_opponents + opponents - 1]
+
+
+	def heads_up(self, hand, other):
+		return self.heads_up_matrix[hand_class(*hand) * NCLASSES + hand_class(*other)]
+
+
+def _heads_up_row(i, samples, seed):
+	rng = random.Random(seed)
+	deck = PokerDeck(rng)
+	combos = [class_combos(j) for j in range(NCLASSES)]
+	row = array('f', [0.0] * NCLASSES)
+
+	for j in range(i + 1, NCLASSES):
+		share = 0.0
+		for _ in range(samples):
+			a = rng.choice(combos[i])
+			b = rng.choice(combos[j])
+			while b[0] in a or b[1] in a:
+				b = rng.choice(combos[j])
+			deck.restore()
+			deck.remove(a + b)
+			board = deck.deal(5)
+			ea = evaluate(list(a) + board)
+			eb = evaluate(list(b) + board)
+			share+= 1.0 if ea > eb else 0.5 if ea == eb else 0.0
+		row[j] = share / samples
+	return i, row
+
+
+def build(path=DEFAULT_PATH, samples=20000, heads_up_samples=2000, workers=None, seed=0):
+	workers = workers or os.cpu_count() or 1
+	master = random.Random(seed)
+	vs_random = array('f', [0.0] * (NCLASSES * MAX_OPPONENTS))
+	heads_up = array('f', [0.0] * (NCLASSES * NCLASSES))
+
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		for i in range(NCLASSES):
+			hand = class_combos(i)[0]
+			for k in range(1, MAX_OPPONENTS + 1):
+				tally = Equity.monte_carlo([hand], n_opponents=k, samples=samples, workers=workers,
+										seed=master.getrandbits(64), executor=pool)
+				vs_random[i * MAX_OPPONENTS + k - 1] = tally.equity(0)
+
+		futures = [pool.submit(_heads_up_row, i, heads_up_samples, master.getrandbits(64)) for i in range(NCLASSES)]
+		for f in futures:
+			i, row = f.result()
+			# the diagonal is an even split by symmetry
+			heads_up[i * NCLASSES + i] = 0.5
+			for j in range(i + 1, NCLASSES):
+				heads_up[i * NCLASSES + j] = row[j]
+				heads_up[j * NCLASSES + i] = 1.0 - row[j]
+
+	tmp = path + '.tmp'
+	with open(tmp, 'wb') as f:
+		f.write(HEADER.pack(MAGIC, VERSION, samples, MAX_OPPONENTS))
+		vs_random.tofile(f)
+		heads_up.tofile(f)
+	os.replace(tmp, path)
+
+
+# mapped once at import, nothing is computed here
+TABLE = PreflopTable.load() if os.path.exists(DEFAULT_PATH) else None
+
+
+def equity(c1, c2, opponents=1):
+	assert TABLE is not None, 'No preflop table at {}, run PreflopTable.py to build it'.format(DEFAULT_PATH)
+	return TABLE.equity(c1, c2, opponents)
+
+
+def heads_up(hand, other):
+	assert TABLE is not None, 'No preflop table at {}, run PreflopTable.py to build it'.format(DEFAULT_PATH)
+	return TABLE.heads_up(hand, other)
+
+
+if __name__ == '__main__':
+	build()
+	table = PreflopTable.load()
+	aces = (PokerCard(1, 'Spades'), PokerCard(1, 'Hearts'))
+	print('AA vs 1..{} opponents: {}'.format(MAX_OPPONENTS, [round(table.equity(*aces, k), 3) for k in range(1, MAX_OPPONENTS + 1)]))
@@ -0,0 +1,275 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from Events import *
+
+# Runtime instrumentation for PokerMatch. MatchStats.attach(match) wraps the match's
+# phase methods and its players' act() with timers as instance attributes; detach()
+# deletes them again, so a match without stats runs the plain class methods and pays
+# nothing at all.
+#
+# Phases: deal (hole cards, blinds and board cards), betting (the betting loop, with
+# player time counted apart), showdown (evaluation and pot split, once per hand).
+
+
+class MatchStats(object):
+	def __init__(self):
+		self.hands = 0
+		self.actions = [0] * len(STREETS)
+		self.evaluations = 0
+		self.deal_time = [0.0] * len(STREETS)
+		# betting loop time per street, player time included
+		self.betting_time = [0.0] * len(STREETS)
+		self.player_time = [0.0] * len(STREETS)
+		self.showdown_time = 0.0
+		self.hand_time = 0.0
+		self.match = None
+		self.players = []
+
+
+	def attach(self, match):
+		assert self.match is None, 'MatchStats is already attached'
+		self.match = match
+		timer = time.perf_counter
+		d = match.__dict__
+
+		def deal_hand():
+			t = timer()
+			match.__class__.deal_hand(match)
+			self.deal_time[PREFLOP]+= timer() - t
+
+		def deal_street(cc):
+			t = timer()
+			match.__class__.deal_street(match, cc)
+			self.deal_time[match.state.street]+= timer() - t
+
+		def betting_round():
+			t = timer()
+			r = match.__class__.betting_round(match)
+			self.betting_time[match.state.street]+= timer() - t
+			return r
+
+		def showdown():
+			t = timer()
+			r = match.__class__.showdown(match)
+			self.showdown_time+= timer() - t
+			self.evaluations+= len(r.players)
+			return r
+
+		def play_hand():
+			t = timer()
+			r = match.__class__.play_hand(match)
+			self.hand_time+= timer() - t
+			self.hands+= 1
+			return r
+
+		d['deal_hand'] = deal_hand
+		d['deal_street'] = deal_street
+		d['betting_round'] = betting_round
+		d['showdown'] = showdown
+		d['play_hand'] = play_hand
+
+		for p in match.players:
+			self.players.append((p, p.__dict__.get('act')))
+			p.act = self.timed_act(p.act, match)
+		match.stats = self
+		return self
+
+
+	def timed_act(self, act, match):
+		timer = time.perf_counter
+		def timed(options):
+			street = match.state.street
+			t = timer()
+			try:
+				return act(options)
+			finally:
+				self.player_time[street]+= timer() - t
+				self.actions[street]+= 1
+		return timed
+
+
+	def detach(self):
+		match = self.match
+		if match is None:
+			return
+		for name in ('deal_hand', 'deal_street', 'betting_round', 'showdown', 'play_hand'):
+			match.__dict__.pop(name, None)
+		for p, act in self.players:
+			if act is None:
+				del p.act
+			else:
+				p.act = act
+		match.stats = None
+		self.match = None
+		self.players = []
+
+
+	def reset(self):
+		match = self.match
+		self.detach()
+		self.__init__()
+		if match is not None:
+			self.attach(match)
+
+
+	def summary(self):
+		# machine-readable totals and rates
+		elapsed = self.hand_time
+		actions = sum(self.actions)
+		per_second = lambda n: n / elapsed if elapsed else 0.0
+		return {'hands': self.hands, 'actions': actions, 'evaluations': self.evaluations, 'seconds': elapsed,
+				'hands_per_s': per_second(self.hands), 'actions_per_s': per_second(actions),
+				'evaluations_per_s': per_second(self.evaluations),
+				'deal': sum(self.deal_time), 'betting': sum(self.betting_time) - sum(self.player_time),
+				'player': sum(self.player_time), 'showdown': self.showdown_time,
+				'streets': {STREETS[i]: {'actions': self.actions[i], 'deal': self.deal_time[i],
+										'betting': self.betting_time[i] - self.player_time[i],
+										'player': self.player_time[i]} for i in range(len(STREETS))}}
+
+
+	def __str__(self):
+		s = self.summary()
+		total = s['seconds'] or 1.0
+		rows = ['{hands} hands in {seconds:.3f}s: {hands_per_s:.0f} hands/s, {actions_per_s:.0f} actions/s, '
+				'{evaluations_per_s:.0f} evaluations/s'.format(**s)]
+		for phase in ('deal', 'betting', 'player', 'showdown'):
+			rows.append('{:<9} {:8.3f}s {:5.1f}%'.format(phase, s[phase], 100 * s[phase] / total))
+		other = total - s['deal'] - s['betting'] - s['player'] - s['showdown']
+		rows.append('{:<9} {:8.3f}s {:5.1f}%'.format('other', other, 100 * other / total))
+		for name in STREETS:
+			st = s['streets'][name]
+			rows.append('{:<9} actions {:8d}  deal {:.3f}s  betting {:.3f}s  player {:.3f}s'.format(
+				name, st['actions'], st['deal'], st['betting'], st['player']))
+		return '\n'.join(rows)
+
+
+class SamplingProfiler(object):
+	# Samples the stack of one thread from a background thread every interval seconds
+	# and counts collapsed stacks ('outer;...;inner' -> samples), the input format of
+	# flamegraph.pl and speedscope.
+	def __init__(self, interval=0.001, thread_id=None):
+		self.interval = interval
+		self.thread_id = thread_id
+		self.stacks = Counter()
+		self.samples = 0
+		self.running = False
+		self.thread = None
+
+
+	def start(self):
+		if self.thread_id is None:
+			self.thread_id = threading.get_ident()
+		self.running = True
+		# the sampler only runs when it gets the GIL, shorten the switch interval to match
+		self.switch_interval = sys.getswitchinterval()
+		sys.setswitchinterval(min(self.switch_interval, self.interval))
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+		return self
+
+
+	def run(self):
+		tid = self.thread_id
+		while self.running:
+			frame = sys._current_frames().get(tid)
+			if frame is not None:
+				names = []
+				while frame is not None:
+					code = frame.f_code
+					names.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+					frame = frame.f_back
+				self.stacks[';'.join(reversed(names))]+= 1
+				self.samples+= 1
+			time.sleep(self.interval)
+
+
+	def stop(self):
+		self.running = False
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+			sys.setswitchinterval(self.switch_interval)
+		return self
+
+
+	def write(self, path):
+		with open(path, 'w') as f:
+			for stack, n in self.stacks.most_common():
+				f.write('{} {}\n'.format(stack, n))
+
+
+	def __enter__(self):
+		return self.start()
+
+
+	def __exit__(self, *exc):
+		self.stop()
+
+
+def collapse_profile(profile):
+	# collapsed caller;callee edges from a cProfile run, weighted by internal time in
+	# microseconds. cProfile has no full stacks, so each line is one call edge.
+	import pstats
+	stats = pstats.Stats(profile)
+	lines = []
+	for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+		name = '{}:{}'.format(os.path.basename(func[0]), func[2])
+		if not callers:
+			lines.append((name, int(tt * 1e6)))
+		total = sum(c[2] for c in callers.values()) or 1.0
+		for caller, (_, _, ctt, _) in callers.items():
+			weight = int(tt * 1e6 * ctt / total)
+			if weight:
+				lines.append(('{}:{};{}'.format(os.path.basename(caller[0]), caller[2], name), weight))
+	return lines
+
+
+def capture(fn, path, mode='sample', interval=0.001):
+	# runs fn() under a profiler and writes collapsed stacks to path; cprofile mode
+	# also keeps the raw pstats dump in path + '.prof'
+	if mode == 'cprofile':
+		profile = cProfile.Profile()
+		result = profile.runcall(fn)
+		profile.dump_stats(path + '.prof')
+		with open(path, 'w') as f:
+			for stack, n in collapse_profile(profile):
+				f.write('{} {}\n'.format(stack, n))
+		return result
+
+	assert mode == 'sample', 'Unknown profiling mode: {}'.format(mode)
+	sampler = SamplingProfiler(interval)
+	with sampler:
+		result = fn()
+	sampler.write(path)
+	return result
+
+
+if __name__ == '__main__':
+	import argparse
+	import random
+	from PokerMatch import PokerMatch, AIPlayer
+	parser = argparse.ArgumentParser(description='Instrumented AIPlayer self-play')
+	parser.add_argument('hands', type=int, nargs='?', default=20000)
+	parser.add_argument('--players', type=int, default=6)
+	parser.add_argument('--profile', choices=['sample', 'cprofile'], help='also write collapsed stacks')
+	parser.add_argument('--out', default='poker.folded', help='collapsed stacks file')
+	args = parser.parse_args()
+
+	match = PokerMatch([AIPlayer('AI-{}'.format(i)) for i in range(args.players)], sink=NullSink(), rng=random.Random(1))
+	stats = MatchStats().attach(match)
+
+	def play():
+		for _ in range(args.hands):
+			match.play_hand()
+			match.rotate()
+
+	if args.profile:
+		capture(play, args.out, args.profile)
+		print('collapsed stacks written to {}'.format(args.out))
+	else:
+		play()
+	print(stats)
@@ -0,0 +1,345 @@
+import math
+from itertools import combinations
+import numpy as np
+from Deck import PokerCard
+from BatchEvaluator import evaluate_ranks
+from PreflopTable import hand_class, class_name
+
+# Weighted hole-card ranges and range-versus-range equity.
+#
+# The 1326 two-card combos are numbered in PokerCard.CARDS order. A Range is a weight in
+# [0, 1] per combo. Card removal works on 52-bit masks: two combos, or a combo and a
+# board, conflict when their masks share a bit. Hand strength is the Evaluator scale
+# that PokerHand.rank uses, so higher is better and equal strength is a tie.
+
+RANKS = '23456789TJQKA'
+SUITS = {'s': 'Spades', 'h': 'Hearts', 'd': 'Diamonds', 'c': 'Clubs'}
+
+COMBOS = list(combinations(PokerCard.CARDS, 2))
+NCOMBOS = len(COMBOS)
+COMBO_INDEX = {pair: i for i, pair in enumerate(COMBOS)}
+# packed card codes and 52-bit card masks per combo
+COMBO_CODES = np.array(COMBOS, dtype=np.int64)
+COMBO_MASKS = np.array([(1 << a.index) | (1 << b.index) for a, b in COMBOS], dtype=np.uint64)
+# combos of each of the 169 hand classes (PreflopTable numbering)
+CLASS_COMBOS = [[] for _ in range(169)]
+for _i, (_a, _b) in enumerate(COMBOS):
+	CLASS_COMBOS[hand_class(_a, _b)].append(_i)
+CLASS_OF_NAME = {class_name(i): i for i in range(169)}
+
+
+def card_mask(cards):
+	mask = 0
+	for c in cards:
+		mask|= 1 << c.index
+	return mask
+
+
+def parse_card(text):
+	# 'Ah', 'Td', '7c'
+	return PokerCard(PokerCard.RANK_VALUE[RANKS.index(text[0].upper())], SUITS[text[1].lower()])
+
+
+def _class_names(token):
+	# hand class names for one range token without weight or specific suits
+	if '-' in token:
+		first, last = token.split('-')
+		assert len(first.rstrip('so')) == 2 and len(last.rstrip('so')) == 2, 'Bad range: {}'.format(token)
+		# both ends suited, both offsuit, or neither for both kinds: KQ-K9 is KQs-K9s and KQo-K9o
+		assert first[2:] == last[2:], 'Range ends differ in suitedness: {}'.format(token)
+		kinds = [first[2:]] if first[2:] else ['s', 'o']
+		(h1, l1, _), (h2, l2, _) = _split(_class_names(first[:2])[0]), _split(_class_names(last[:2])[0])
+		if h1 == l1:
+			# pairs: TT-77
+			return [RANKS[r] * 2 for r in range(min(h1, h2), max(h1, h2) + 1)]
+		if h1 == h2:
+			# fixed top card: A5s-A2s
+			return [RANKS[h1] + RANKS[r] + k for k in kinds for r in range(min(l1, l2), max(l1, l2) + 1)]
+		# both cards move together: 76s-54s
+		assert h1 - l1 == h2 - l2, 'Bad range: {}'.format(token)
+		return [RANKS[h] + RANKS[h - (h1 - l1)] + k for k in kinds for h in range(min(h1, h2), max(h1, h2) + 1)]
+
+	plus = token.endswith('+')
+	token = token.rstrip('+')
+	assert len(token) in (2, 3) and token[0] in RANKS and token[1] in RANKS, 'Bad range: {}'.format(token)
+	hi, lo = sorted((RANKS.index(token[0]), RANKS.index(token[1])), reverse=True)
+	kinds = [token[2]] if len(token) == 3 else ['s', 'o']
+	if hi == lo:
+		return [RANKS[r] * 2 for r in range(hi, 13 if plus else hi + 1)]
+	names = []
+	for k in kinds:
+		# AQs+ raises the kicker up to just below the top card
+		for r in range(lo, hi if plus else lo + 1):
+			names.append(RANKS[hi] + RANKS[r] + k)
+	return names
+
+
+def _split(name):
+	hi, lo = RANKS.index(name[0]), RANKS.index(name[1])
+	return hi, lo, name[2:]
+
+
+class Range(object):
+	def __init__(self, weights=None):
+		self.weights = np.zeros(NCOMBOS) if weights is None else np.asarray(weights, dtype=np.float64)
+
+
+	@staticmethod
+	def parse(text):
+		# comma separated tokens: AA, TT+, 99-66, AKs, AQo+, A5s-A2s, 76s-54s, KQ, AhKh;
+		# ':w' after a token gives it weight w, e.g. 'AKo:0.5'
+		r = Range()
+		for token in text.replace(' ', '').split(','):
+			if not token:
+				continue
+			weight = 1.0
+			if ':' in token:
+				token, w = token.split(':')
+				weight = float(w)
+			if len(token) == 4 and token[1].lower() in SUITS and token[3].lower() in SUITS:
+				a, b = sorted((parse_card(token[:2]), parse_card(token[2:])), key=lambda c: c.index)
+				assert a != b, 'Bad combo: {}'.format(token)
+				r.weights[COMBO_INDEX[(a, b)]] = weight
+				continue
+			for name in _class_names(token):
+				r.weights[CLASS_COMBOS[CLASS_OF_NAME[name]]] = weight
+		return r
+
+
+	@staticmethod
+	def of_hands(hands):
+		r = Range()
+		for a, b in hands:
+			a, b = sorted((a, b), key=lambda c: c.index)
+			r.weights[COMBO_INDEX[(a, b)]] = 1.0
+		return r
+
+
+	@staticmethod
+	def full():
+		return Range(np.ones(NCOMBOS))
+
+
+	def indices(self):
+		return np.flatnonzero(self.weights)
+
+
+	def combos(self):
+		return [(COMBOS[i], self.weights[i]) for i in self.indices()]
+
+
+	def dead(self, cards):
+		# copy without the combos that use any of cards
+		mask = np.uint64(card_mask(cards))
+		w = self.weights.copy()
+		w[(COMBO_MASKS & mask) != 0] = 0.0
+		return Range(w)
+
+
+	def __len__(self):
+		return int(np.count_nonzero(self.weights))
+
+
+	def __str__(self):
+		return '{} combos, weight {:.2f}'.format(len(self), self.weights.sum())
+
+
+class RangeEquity(object):
+	def __init__(self, equities, boards, exact, combo_equity=None):
+		# one equity per range, in the order the ranges were given
+		self.equities = equities
+		self.boards = boards
+		self.exact = exact
+		# heads-up only: equity of each of the first range's combos, nan where not in the range
+		self.combo_equity = combo_equity
+
+
+	def __str__(self):
+		return ', '.join('{:.4f}'.format(e) for e in self.equities) + ' ({} {} boards)'.format(
+			self.boards, 'exact' if self.exact else 'sampled')
+
+
+def _boards(board, k, samples, exact_limit, rng):
+	# all remaining boards when there are few enough, else samples random ones; (B, k) card indices
+	dead = {c.index for c in board}
+	rest = np.array([i for i in range(52) if i not in dead], dtype=np.int64)
+	if k == 0:
+		return np.zeros((1, 0), dtype=np.int64), True
+	if math.comb(len(rest), k) <= exact_limit:
+		return rest[np.array(list(combinations(range(len(rest)), k)), dtype=np.int64)], True
+	keys = rng.random((samples, len(rest)))
+	return rest[np.argpartition(keys, k, axis=1)[:, :k]], False
+
+
+def _board_masks(boards):
+	masks = np.zeros(len(boards), dtype=np.uint64)
+	for j in range(boards.shape[1]):
+		masks|= np.left_shift(np.uint64(1), boards[:, j].astype(np.uint64))
+	return masks
+
+
+CARD_CODES = np.array(PokerCard.CARDS, dtype=np.int64)
+# card indices of each combo, and the 51 combos holding each card
+COMBO_CARDS = np.array([(a.index, b.index) for a, b in COMBOS], dtype=np.int64)
+CARD_COMBOS = np.array([np.flatnonzero((COMBO_CARDS == c).any(axis=1)) for c in range(52)], dtype=np.int64)
+
+
+def heads_up(hero, villain, board=None, samples=1000, exact_limit=2000, seed=None, chunk=32):
+	# Every hero combo against every villain combo on every board, weighted by w_hero * w_villain,
+	# skipping pairs that share a card with each other or with the board. Per board the villain
+	# weights are summed in rank order, so a hero combo's score is two binary searches; the villain
+	# combos holding one of its cards (51 per card) are then taken back out.
+	board = list(board or [])
+	rng = np.random.default_rng(seed)
+	board_mask = np.uint64(card_mask(board))
+	w1 = np.where((COMBO_MASKS & board_mask) == 0, hero.weights, 0.0)
+	w2 = np.where((COMBO_MASKS & board_mask) == 0, villain.weights, 0.0)
+	i1 = np.flatnonzero(w1)
+	assert len(i1) and w2.any(), 'A range is empty on this board'
+
+	# evaluate only combos some range holds
+	used = np.flatnonzero(w1 + w2)
+	used_masks = COMBO_MASKS[used]
+	known = CARD_CODES[[c.index for c in board]] if board else np.zeros(0, dtype=np.int64)
+	# villain combos sharing the first / second card of each hero combo
+	near_a = CARD_COMBOS[COMBO_CARDS[i1, 0]]
+	near_b = CARD_COMBOS[COMBO_CARDS[i1, 1]]
+
+	boards, exact = _boards(board, 5 - len(board), samples, exact_limit, rng)
+	masks = _board_masks(boards)
+	num = np.zeros(len(i1))
+	den = np.zeros(len(i1))
+
+	for start in range(0, len(boards), chunk):
+		b = boards[start:start + chunk]
+		nb = len(b)
+		# (combos, boards, 7) rows of hole cards + board
+		cards = np.empty((len(used), nb, 7), dtype=np.int64)
+		cards[:, :, :2] = COMBO_CODES[used][:, None, :]
+		cards[:, :, 2:2 + len(board)] = known
+		cards[:, :, 2 + len(board):] = CARD_CODES[b][None, :, :]
+		free_used = (used_masks[:, None] & masks[start:start + nb][None, :]) == 0
+		# rows with a card twice have no strength; give them any valid hand, they are masked out
+		cards[~free_used] = CARD_CODES[:7]
+		ranks = np.zeros((NCOMBOS, nb), dtype=np.int64)
+		ranks[used] = evaluate_ranks(cards.reshape(-1, 7)).reshape(len(used), nb)
+		free = np.zeros((NCOMBOS, nb), dtype=bool)
+		free[used] = free_used
+		v = w2[:, None] * free
+
+		# one sorted run per board: ranks are below 8192, so offset board k by k * 8192
+		offset = np.arange(nb, dtype=np.int64) * 8192
+		keys = (ranks + offset[None, :]).T.ravel()
+		order = np.argsort(keys, kind='stable')
+		keys = keys[order]
+		cw = np.concatenate(([0.0], np.cumsum(v.T.ravel()[order])))
+		base = cw[np.arange(nb) * NCOMBOS]
+		total = cw[(np.arange(nb) + 1) * NCOMBOS] - base
+		r1 = ranks[i1]
+		q = (r1 + offset[None, :]).ravel()
+		below = cw[np.searchsorted(keys, q, 'left')].reshape(r1.shape) - base
+		upto = cw[np.searchsorted(keys, q, 'right')].reshape(r1.shape) - base
+		s = 0.5 * (below + upto)
+		d = np.broadcast_to(total, r1.shape).copy()
+
+		for near in (near_a, near_b):
+			rn = ranks[near]
+			vn = v[near]
+			s-= (vn * ((r1[:, None, :] > rn) + 0.5 * (r1[:, None, :] == rn))).sum(axis=1)
+			d-= vn.sum(axis=1)
+		# the villain combo with both hero cards was taken out twice
+		s+= 0.5 * v[i1]
+		d+= v[i1]
+
+		f1 = free[i1]
+		num+= (s * f1).sum(axis=1)
+		den+= (d * f1).sum(axis=1)
+
+	total = (w1[i1] * den).sum()
+	assert total, 'No hero and villain combos fit together on this board'
+	equity = (w1[i1] * num).sum() / total
+	combo_equity = np.full(NCOMBOS, np.nan)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		combo_equity[i1] = num / den
+	return RangeEquity([equity, 1.0 - equity], len(boards), exact, combo_equity)
+
+
+def multiway(ranges, board=None, samples=100000, seed=None, batch=20000, max_draws=None):
+	# Monte Carlo over weighted combo draws; draws where two hands share a card are rejected.
+	# At most max_draws draws are made (100 per sample by default), so ranges that hardly
+	# ever fit together end with fewer samples, and ranges that never do raise.
+	board = list(board or [])
+	rng = np.random.default_rng(seed)
+	board_mask = np.uint64(card_mask(board))
+	nplayers = len(ranges)
+	choices = []
+	for r in ranges:
+		idx = r.indices()
+		idx = idx[(COMBO_MASKS[idx] & board_mask) == 0]
+		assert len(idx), 'A range is empty on this board'
+		w = r.weights[idx]
+		choices.append((idx, w / w.sum()))
+	known = np.array([c.index for c in board], dtype=np.int64)
+	k = 5 - len(board)
+	shares = np.zeros(nplayers)
+	done = 0
+	drawn = 0
+	max_draws = max_draws or 100 * samples
+
+	while done < samples and drawn < max_draws:
+		n = min(batch, samples - done, max_draws - drawn)
+		drawn+= n
+		hands = np.stack([rng.choice(idx, size=n, p=p) for idx, p in choices], axis=1)
+		masks = COMBO_MASKS[hands]
+		ok = np.ones(n, dtype=bool)
+		used = np.zeros(n, dtype=np.uint64)
+		for i in range(nplayers):
+			ok&= (used & masks[:, i]) == 0
+			used|= masks[:, i]
+		hands = hands[ok]
+		used = used[ok] | board_mask
+		n = len(hands)
+		if n == 0:
+			continue
+
+		# board cards: random keys, with dead cards pushed past the end
+		keys = rng.random((n, 52))
+		bits = (used[:, None] >> np.arange(52, dtype=np.uint64)[None, :]) & np.uint64(1)
+		keys[bits.astype(bool)] = 2.0
+		cols = np.argpartition(keys, k, axis=1)[:, :k] if k else np.zeros((n, 0), dtype=np.int64)
+		board_codes = np.concatenate([np.broadcast_to(CARD_CODES[known], (n, len(known))), CARD_CODES[cols]], axis=1)
+
+		ranks = np.empty((n, nplayers), dtype=np.int64)
+		for i in range(nplayers):
+			ranks[:, i] = evaluate_ranks(np.concatenate([COMBO_CODES[hands[:, i]], board_codes], axis=1))
+		top = ranks.max(axis=1, keepdims=True)
+		best = ranks == top
+		shares+= (best / best.sum(axis=1, keepdims=True)).sum(axis=0)
+		done+= n
+
+	assert done, 'No draw gave hands without a shared card'
+	return RangeEquity(list(shares / done), done, False)
+
+
+def equity(ranges, board=None, samples=None, seed=None):
+	# heads-up goes through the combo-by-combo matrix, three or more ranges are sampled
+	ranges = [Range.parse(r) if isinstance(r, str) else r for r in ranges]
+	assert len(ranges) >= 2, 'Equity needs at least two ranges'
+	if len(ranges) == 2:
+		return heads_up(ranges[0], ranges[1], board, samples or 1000, seed=seed)
+	return multiway(ranges, board, samples or 100000, seed=seed)
+
+
+if __name__ == '__main__':
+	import time
+	t = time.time()
+	print('AA vs KK:', equity(['AA', 'KK'], samples=2000, seed=1), '{:.2f}s'.format(time.time() - t))
+	t = time.time()
+	print('QQ+, AKs vs 76s-54s, 22+:', equity(['QQ+, AKs', '76s-54s, 22+'], samples=2000, seed=1), '{:.2f}s'.format(time.time() - t))
+	t = time.time()
+	flop = [parse_card(c) for c in ('Ah', '7d', '2c')]
+	print('full vs full on Ah 7d 2c:', equity([Range.full(), Range.full()], board=flop, seed=1), '{:.2f}s'.format(time.time() - t))
+	t = time.time()
+	print('full vs full preflop:', equity([Range.full(), Range.full()], samples=300, seed=1), '{:.2f}s'.format(time.time() - t))
+	t = time.time()
+	print('AA vs KK vs QQ:', equity(['AA', 'KK', 'QQ'], samples=200000, seed=1), '{:.2f}s'.format(time.time() - t))
@@ -0,0 +1,86 @@
+import sys
+import time
+
+# One-line reproductions of bugs fixed in review, kept as quick checks:
+#   python RegressionChecks.py            (or python -m pytest RegressionChecks.py)
+# Each check is a plain function that asserts; numpy is needed for the range checks.
+
+
+def test_multiway_equity_runs_several_batches():
+	# multiway() once reused its draw counter for the board columns and crashed from the second batch on
+	from Range import equity
+	result = equity(['AA', 'KK', 'QQ'], samples=50000, seed=1)
+	assert result.boards == 50000, result.boards
+	assert abs(sum(result.equities) - 1) < 1e-9
+	assert result.equities[0] > result.equities[1] > 0
+
+
+def test_range_without_suffix_expands_both_kinds():
+	from Range import Range
+	assert len(Range.parse('KQ-K9').combos()) == 64
+	assert len(Range.parse('KQs-K9s').combos()) == 16
+	assert len(Range.parse('KQo-K9o').combos()) == 48
+	try:
+		Range.parse('KQs-K9o')
+	except AssertionError:
+		pass
+	else:
+		raise AssertionError('mixed suited/offsuit range ends should be rejected')
+
+
+def test_search_stops_at_rollout_budget():
+	# search() once counted showdown sizes instead of rollouts and played ~16x its budget
+	import random
+	from PokerMatch import PokerMatch, AIPlayer
+	from SearchPlayer import search
+	from Events import NullSink
+	match = PokerMatch([AIPlayer('P{}'.format(i)) for i in range(4)], sink=NullSink(), rng=random.Random(1))
+	match.deal_hand()
+	state = match.state
+	options = state.legal_actions()
+	for budget, batch in ((64, 64), (25, 10), (5, 64)):
+		_, counts = search(state, state.to_act, options, max_rollouts=budget, batch=batch, seed=1)
+		assert [c for o, c in zip(options, counts) if o != 'fold'] == [budget] * sum(o != 'fold' for o in options), counts
+
+
+def test_preflop_strength_uses_equity_table():
+	# preflop hand_strength once ranked hole cards pairs-first, putting 22 above AKs
+	from array import array
+	import Equity
+	import PreflopTable
+	from HandTracker import HandTracker
+	from Range import parse_card
+	aks = [parse_card('As'), parse_card('Ks')]
+	deuces = [parse_card('2h'), parse_card('2d')]
+	saved = PreflopTable.TABLE
+	try:
+		PreflopTable.TABLE = None
+		assert HandTracker(aks).hand_strength() is None and HandTracker(aks).effective_strength() is None
+		# a one-opponent table holding just these two classes, sampled the way build() does
+		floats = array('f', [0.0] * (PreflopTable.NCLASSES * (1 + PreflopTable.NCLASSES)))
+		for hand in (aks, deuces):
+			tally = Equity.monte_carlo([hand], n_opponents=1, samples=4000, workers=1, seed=1)
+			floats[PreflopTable.hand_class(*hand)] = tally.equity(0)
+		buf = PreflopTable.HEADER.pack(PreflopTable.MAGIC, PreflopTable.VERSION, 4000, 1) + floats.tobytes()
+		PreflopTable.TABLE = PreflopTable.PreflopTable(buf, 4000, 1)
+		strong, weak = HandTracker(aks), HandTracker(deuces)
+		assert strong.hand_strength() > weak.hand_strength() > 0.4, (strong.hand_strength(), weak.hand_strength())
+		assert strong.effective_strength() == strong.hand_strength()
+		assert strong.hand_strength(2) is None
+	finally:
+		PreflopTable.TABLE = saved
+
+
+if __name__ == '__main__':
+	checks = [(name, fn) for name, fn in sorted(globals().items()) if name.startswith('test_') and callable(fn)]
+	failed = 0
+	for name, fn in checks:
+		t = time.time()
+		try:
+			fn()
+			status = 'ok'
+		except Exception as e:
+			failed+= 1
+			status = 'FAIL {}: {}'.format(type(e).__name__, e)
+		print('{:<50} {:.2f}s {}'.format(name, time.time() - t, status))
+	sys.exit(1 if failed else 0)
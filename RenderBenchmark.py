@@ -0,0 +1,210 @@
+import os
+# no window: SDL renders into memory, so this runs on a CI box without a display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import random
+import sys
+import time
+import pygame
+from Events import BufferSink
+from PokerMatch import PokerMatch, AIPlayer
+import GameViewController as view
+
+# Headless frame-time benchmark for MenuScene and PokerTable. Each scene is driven for
+# N frames by scripted input (mouse moves over the menu, the events of a seeded match
+# for the table) and every frame is timed in four parts: events, update, render and
+# the display update. Surface constructions and font renders are counted per frame.
+#   python RenderBenchmark.py --frames 600 --out frames.json [--full-flip]
+
+
+class AllocationCounter(object):
+	# counts pygame.Surface() constructions and Font.render() calls made through the pygame module
+	def __init__(self):
+		self.surfaces = 0
+		self.renders = 0
+		self.installed = False
+
+
+	def install(self):
+		counter = self
+		self.surface_type = pygame.Surface
+		self.sysfont = pygame.font.SysFont
+
+		class CountingFont(pygame.font.Font):
+			def render(self, *args, **kwargs):
+				counter.renders+= 1
+				return super().render(*args, **kwargs)
+
+		def surface(*args, **kwargs):
+			counter.surfaces+= 1
+			return counter.surface_type(*args, **kwargs)
+
+		def font(path, size, bold, italic):
+			f = CountingFont(path, size)
+			f.set_bold(bold)
+			f.set_italic(italic)
+			return f
+
+		def sysfont(name, size, bold=False, italic=False, constructor=None):
+			return counter.sysfont(name, size, bold, italic, constructor=constructor or font)
+
+		pygame.Surface = surface
+		pygame.font.SysFont = sysfont
+		self.installed = True
+		return self
+
+
+	def uninstall(self):
+		if self.installed:
+			pygame.Surface = self.surface_type
+			pygame.font.SysFont = self.sysfont
+			self.installed = False
+
+
+	def take(self):
+		counts = self.surfaces, self.renders
+		self.surfaces = 0
+		self.renders = 0
+		return counts
+
+
+class ScriptedFeed(object):
+	# stands in for SimulationWorker: replays recorded events, per_frame of them per poll()
+	def __init__(self, events, per_frame=1):
+		self.events = events
+		self.per_frame = per_frame
+		self.pos = 0
+
+
+	def poll(self, limit=256):
+		n = min(self.per_frame, limit)
+		out = self.events[self.pos:self.pos + n]
+		self.pos+= n
+		if self.pos >= len(self.events):
+			self.pos = 0
+		return out
+
+
+	def stop(self):
+		pass
+
+
+def record_events(nplayers, hands, seed):
+	sink = BufferSink()
+	rng = random.Random(seed)
+	state = random.getstate()
+	random.seed(rng.getrandbits(64))
+	try:
+		match = PokerMatch([AIPlayer('P{}'.format(i)) for i in range(nplayers)], sink=sink, rng=rng)
+		for _ in range(hands):
+			match.play_hand()
+			match.rotate()
+	finally:
+		random.setstate(state)
+	return sink.events
+
+
+def menu_script(scene):
+	# the pointer sweeps down the menu and back, crossing every button
+	ys = list(range(0, scene.height, 4))
+	path = ys + ys[::-1]
+	x = int(scene.width / 2)
+	return lambda frame: [pygame.event.Event(pygame.MOUSEMOTION, pos=(x, path[frame % len(path)]), rel=(0, 4), buttons=(0, 0, 0))]
+
+
+def percentiles(values):
+	v = sorted(values)
+	n = len(v)
+	pick = lambda q: 1000 * v[min(n - 1, int(q * n))]
+	return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': 1000 * v[-1], 'mean': 1000 * sum(v) / n}
+
+
+def run_scene(controller, scene, script, frames, counter, full_flip=False):
+	controller.manager.go_to(scene)
+	display = controller.display
+	timer = time.perf_counter
+	parts = {'events': [], 'update': [], 'render': [], 'flip': [], 'frame': []}
+	surfaces = []
+	renders = []
+	dirty = []
+	counter.take()
+
+	for frame in range(frames):
+		t0 = timer()
+		for event in script(frame):
+			scene.handle_event(event)
+		t1 = timer()
+		scene.update()
+		t2 = timer()
+		rects = scene.render(display)
+		t3 = timer()
+		if full_flip:
+			pygame.display.flip()
+		elif rects:
+			pygame.display.update(rects)
+		t4 = timer()
+
+		parts['events'].append(t1 - t0)
+		parts['update'].append(t2 - t1)
+		parts['render'].append(t3 - t2)
+		parts['flip'].append(t4 - t3)
+		parts['frame'].append(t4 - t0)
+		s, r = counter.take()
+		surfaces.append(s)
+		renders.append(r)
+		dirty.append(sum(pygame.Rect(rc).width * pygame.Rect(rc).height for rc in rects or []))
+
+	# the first frame repaints everything, report it apart
+	result = {name: percentiles(v[1:] or v) for name, v in parts.items()}
+	result['first_frame_ms'] = 1000 * parts['frame'][0]
+	result['surfaces_per_frame'] = sum(surfaces[1:]) / max(1, frames - 1)
+	result['font_renders_per_frame'] = sum(renders[1:]) / max(1, frames - 1)
+	result['dirty_pixels_per_frame'] = sum(dirty[1:]) / max(1, frames - 1)
+	result['frames'] = frames
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Headless frame-time benchmark')
+	parser.add_argument('--frames', type=int, default=600)
+	parser.add_argument('--players', type=int, nargs='*', default=list(range(3, 9)))
+	parser.add_argument('--events-per-frame', type=int, default=1, help='table events replayed per frame')
+	parser.add_argument('--size', type=int, nargs=2, default=(720, 480))
+	parser.add_argument('--full-flip', action='store_true', help='flip the whole display every frame instead of dirty rects')
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--out', help='write results as JSON to this file')
+	args = parser.parse_args(argv)
+
+	counter = AllocationCounter().install()
+	try:
+		size = tuple(args.size)
+		controller = view.GameViewController(size)
+		menu = view.MenuScene(size)
+		controller.add_scene(menu)
+		results = {'menu': run_scene(controller, menu, menu_script(menu), args.frames, counter, args.full_flip)}
+
+		for n in args.players:
+			feed = ScriptedFeed(record_events(n, 50, args.seed), args.events_per_frame)
+			table = view.PokerTable(size, n, feed)
+			results['table_{}'.format(n)] = run_scene(controller, table, lambda frame: [], args.frames, counter, args.full_flip)
+	finally:
+		counter.uninstall()
+		pygame.quit()
+
+	for name, r in results.items():
+		print('{:<9} frame p50 {:6.3f} p99 {:6.3f} max {:6.3f} ms | render p50 {:6.3f} | flip p50 {:6.3f} | '
+			'{:.2f} surfaces {:.2f} font renders per frame'.format(name, r['frame']['p50'], r['frame']['p99'], r['frame']['max'],
+																	r['render']['p50'], r['flip']['p50'], r['surfaces_per_frame'],
+																	r['font_renders_per_frame']))
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump({'python': sys.version.split()[0], 'pygame': pygame.version.ver, 'full_flip': args.full_flip,
+					'results': results}, f, indent=2, sort_keys=True)
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
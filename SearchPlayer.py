@@ -0,0 +1,184 @@
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Deck import PokerDeck
+from Evaluator import evaluate
+from Events import *
+from PokerMatch import PokerMatch, PokerPlayer, AIPlayer
+
+try:
+	import numpy as np
+	from BatchEvaluator import evaluate_ranks
+except ImportError:
+	np = None
+
+# Flat Monte Carlo search over the options of one decision. Each rollout deals the
+# unknown cards (opponents' hole cards and the rest of the board), plays the hand out
+# from GameState with every seat acting uniformly at random, the way AIPlayer does,
+# and scores the chips won minus the chips put in from now on. Showdowns of a batch
+# are evaluated together, with BatchEvaluator when numpy is available.
+
+
+def _rollout(state, seat, action, deck, rand):
+	# returns (state at the end of the hand, chips seat put in after the decision, board)
+	s = state.clone()
+	paid = -s.contributed[seat]
+	s.apply(action)
+	board = list(s.board) + deck.deal(5 - len(s.board))
+	while True:
+		if s.round_over:
+			paid+= s.contributed[seat]
+			if s.hand_over:
+				break
+			n = 3 if s.street == PREFLOP else 1
+			s.next_street(board[len(s.board):len(s.board) + n])
+		else:
+			options = s.legal_actions()
+			s.apply(options[int(rand() * len(options))])
+	return s, paid, board
+
+
+def search(state, seat, options, time_budget=None, max_rollouts=None, batch=64, seed=None):
+	# (total value, rollouts) per option; fold is worth exactly 0 and is never rolled out
+	rng = random.Random(seed)
+	rand = rng.random
+	deck = PokerDeck(rng)
+	deck.remove(list(state.hole[seat]) + list(state.board))
+	others = [s for s in state.ring.seats() if s != seat]
+	deadline = time.perf_counter() + time_budget if time_budget is not None else None
+	totals = [0.0] * len(options)
+	counts = [0] * len(options)
+	searched = [i for i, o in enumerate(options) if o != 'fold']
+	done = 0
+
+	while searched:
+		rows = []
+		pending = []
+		n = batch if max_rollouts is None else min(batch, max_rollouts - done)
+		for i in searched:
+			for _ in range(n):
+				deck.reset()
+				hole = list(state.hole)
+				for o in others:
+					hole[o] = deck.deal(2)
+				s, paid, board = _rollout(state, seat, options[i], deck, rand)
+				counts[i]+= 1
+				if not s.ring.active[seat]:
+					totals[i]-= paid
+				elif s.ring.count == 1:
+					totals[i]+= s.pot - paid
+				else:
+					# showdown: our row first, scored once the batch is evaluated
+					pending.append((i, paid, s.pot, len(rows), s.ring.count))
+					rows.append(list(hole[seat]) + board)
+					rows.extend(list(hole[o]) + board for o in s.ring.seats() if o != seat)
+
+		if rows:
+			ranks = evaluate_ranks(np.array(rows, dtype=np.int64)).tolist() if np is not None else [evaluate(r) for r in rows]
+			for i, paid, pot, start, nshow in pending:
+				mine = ranks[start]
+				top = max(ranks[start:start + nshow])
+				won = pot / ranks[start:start + nshow].count(top) if mine == top else 0
+				totals[i]+= won - paid
+
+		done+= n
+		if max_rollouts is not None and done >= max_rollouts:
+			break
+		if deadline is not None and time.perf_counter() >= deadline:
+			break
+	return totals, counts
+
+
+class SearchPlayer(PokerPlayer):
+	# Picks the option with the best mean rollout value, searching until time_budget
+	# seconds or max_rollouts rollouts per option, whichever comes first.
+	def __init__(self, name, time_budget=0.05, max_rollouts=None, batch=64, workers=1, executor=None, seed=None):
+		super().__init__(name)
+		assert time_budget is not None or max_rollouts is not None, 'SearchPlayer needs a time or rollout budget'
+		self.time_budget = time_budget
+		self.max_rollouts = max_rollouts
+		self.batch = batch
+		self.workers = workers
+		self.executor = executor
+		self.rng = random.Random(seed)
+		# per decision: seconds taken and rollouts played
+		self.latencies = []
+		self.rollouts = []
+		self.last_values = None
+
+
+	def act(self, options):
+		t = time.perf_counter()
+		state = self.match.state if self.match is not None else None
+		if len(options) == 1 or state is None or state.round_over or self.match.players[state.to_act] is not self:
+			# nothing to search, or asked outside a match
+			action = options[0] if len(options) == 1 else self.rng.choice(options)
+			self.record(t, 0)
+			return action
+
+		seed = self.rng.getrandbits(64)
+		if self.workers > 1 or self.executor is not None:
+			totals, counts = self.search_pool(state, options, seed)
+		else:
+			totals, counts = search(state, state.to_act, options, self.time_budget, self.max_rollouts, self.batch, seed)
+
+		values = [totals[i] / counts[i] if counts[i] else 0.0 for i in range(len(options))]
+		self.last_values = dict(zip(options, values))
+		best = max(range(len(options)), key=lambda i: values[i])
+		self.record(t, sum(counts))
+		return options[best]
+
+
+	def search_pool(self, state, options, seed):
+		# one search per worker with its own stream; rollout budgets are split between them
+		workers = self.workers if self.executor is None else max(self.workers, 2)
+		master = random.Random(seed)
+		budget = self.max_rollouts
+		per_worker = [budget // workers + (1 if k < budget % workers else 0) if budget is not None else None for k in range(workers)]
+		pool = self.executor or ProcessPoolExecutor(max_workers=workers)
+		try:
+			futures = [pool.submit(search, state, state.to_act, options, self.time_budget, n, self.batch,
+								master.getrandbits(64)) for n in per_worker]
+			totals = [0.0] * len(options)
+			counts = [0] * len(options)
+			for f in futures:
+				t, c = f.result()
+				for i in range(len(options)):
+					totals[i]+= t[i]
+					counts[i]+= c[i]
+		finally:
+			if self.executor is None:
+				pool.shutdown()
+		return totals, counts
+
+
+	def record(self, start, rollouts):
+		self.latencies.append(time.perf_counter() - start)
+		self.rollouts.append(rollouts)
+
+
+	def latency_stats(self):
+		# decision latency in milliseconds
+		if not self.latencies:
+			return None
+		lat = sorted(self.latencies)
+		n = len(lat)
+		return {'decisions': n, 'mean': 1000 * sum(lat) / n, 'p50': 1000 * lat[n // 2],
+				'p95': 1000 * lat[min(n - 1, int(0.95 * n))], 'max': 1000 * lat[-1],
+				'rollouts': sum(self.rollouts) / n}
+
+
+if __name__ == '__main__':
+	import sys
+	from SelfPlay import TallySink
+	hands = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+	searcher = SearchPlayer('Search', time_budget=0.02, seed=1)
+	players = [searcher, AIPlayer('AI-1'), AIPlayer('AI-2')]
+	sink = TallySink(len(players))
+	match = PokerMatch(players, sink=sink, rng=random.Random(1))
+	for _ in range(hands):
+		match.play_hand()
+		match.rotate()
+	print(sink.tally)
+	stats = searcher.latency_stats()
+	print('{decisions} decisions: mean {mean:.1f}ms p50 {p50:.1f}ms p95 {p95:.1f}ms max {max:.1f}ms, {rollouts:.0f} rollouts/decision'.format(**stats))
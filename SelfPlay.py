@@ -0,0 +1,129 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PokerMatch import PokerMatch, AIPlayer
+from Events import *
+
+# default shard count; fixed so a seed gives the same tally on any number of workers
+SHARDS = 64
+
+
+class SelfPlayTally(object):
+	def __init__(self, nseats):
+		self.hands = 0
+		self.showdowns = 0
+		# outright wins and split wins per seat
+		self.wins = [0] * nseats
+		self.splits = [0] * nseats
+		# chips won minus chips put in, per seat
+		self.net = [0] * nseats
+
+
+	def merge(self, other):
+		self.hands+= other.hands
+		self.showdowns+= other.showdowns
+		for i in range(len(self.wins)):
+			self.wins[i]+= other.wins[i]
+			self.splits[i]+= other.splits[i]
+			self.net[i]+= other.net[i]
+		return self
+
+
+	def __str__(self):
+		rows = ['{} hands, {} showdowns'.format(self.hands, self.showdowns)]
+		for i in range(len(self.wins)):
+			rows.append('seat {}: wins {} splits {} net {:+}'.format(i, self.wins[i], self.splits[i], self.net[i]))
+		return '\n'.join(rows)
+
+
+class TallySink(EventSink):
+	# keeps per-seat results from the event stream, no formatting
+	def __init__(self, nseats):
+		self.tally = SelfPlayTally(nseats)
+		self.street_bets = [0] * nseats
+		self.winners = []
+		self.showdown = False
+
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		if kind == BLIND or kind == BET or kind == RAISE:
+			# bets and raises are the seat's total for the street
+			self.tally.net[seat]-= amount - self.street_bets[seat]
+			self.street_bets[seat] = amount
+		elif kind == CALL:
+			self.tally.net[seat]-= amount
+			self.street_bets[seat]+= amount
+		elif kind == ROUND_END:
+			self.street_bets = [0] * len(self.street_bets)
+		elif kind == SHOWDOWN:
+			self.showdown = True
+		elif kind == WIN:
+			self.tally.net[seat]+= amount
+			self.winners.append(seat)
+		elif kind == HAND_END:
+			t = self.tally
+			t.hands+= 1
+			if self.showdown:
+				t.showdowns+= 1
+			if len(self.winners) == 1:
+				t.wins[self.winners[0]]+= 1
+			else:
+				for s in self.winners:
+					t.splits[s]+= 1
+			self.winners = []
+			self.showdown = False
+
+
+def _play(player_classes, hands, seed):
+	# the deck gets its own stream; AIPlayer draws from the global RNG, which belongs to this worker
+	rng = random.Random(seed)
+	state = random.getstate()
+	random.seed(rng.getrandbits(64))
+	try:
+		players = [cls('{}-{}'.format(cls.__name__, i)) for i, cls in enumerate(player_classes)]
+		sink = TallySink(len(players))
+		match = PokerMatch(players, sink=sink, rng=rng)
+		for _ in range(hands):
+			match.play_hand()
+			match.rotate()
+		return sink.tally
+	finally:
+		random.setstate(state)
+
+
+def run(player_classes, hands, workers=None, shards=None, seed=0, executor=None):
+	# player_classes: one PokerPlayer subclass per seat, built as cls(name) in each worker
+	workers = workers or os.cpu_count() or 1
+	# the shard count, not the worker count, fixes the seeds and hands per shard
+	shards = min(shards or SHARDS, hands)
+	master = random.Random(seed)
+	seeds = [master.getrandbits(64) for _ in range(shards)]
+	counts = [hands // shards + (1 if i < hands % shards else 0) for i in range(shards)]
+
+	tally = SelfPlayTally(len(player_classes))
+	if workers == 1 and executor is None:
+		for n, s in zip(counts, seeds):
+			tally.merge(_play(player_classes, n, s))
+		return tally
+
+	pool = executor or ProcessPoolExecutor(max_workers=workers)
+	try:
+		# integer counts, so merging in completion order is still exact
+		futures = [pool.submit(_play, player_classes, n, s) for n, s in zip(counts, seeds)]
+		for f in as_completed(futures):
+			tally.merge(f.result())
+	finally:
+		if executor is None:
+			pool.shutdown()
+	return tally
+
+
+if __name__ == '__main__':
+	import sys
+	hands = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+	t = time.time()
+	tally = run([AIPlayer] * 6, hands, seed=1)
+	elapsed = time.time() - t
+	print(tally)
+	print('{:.0f} hands/s'.format(tally.hands / elapsed))
@@ -0,0 +1,168 @@
+import multiprocessing
+import queue
+import random
+import threading
+import time
+from Events import *
+from PokerMatch import PokerMatch, AIPlayer
+
+# Runs a PokerMatch away from the render loop. The engine plays in a worker thread (or
+# process) and pushes its events through a bounded queue; the view drains the queue
+# once per frame into a TableSnapshot and only ever reads the snapshot. A full queue
+# blocks the engine, so a view that falls behind slows the game down instead of
+# letting the backlog grow.
+
+STACK = 1000
+
+
+class _Stopped(Exception):
+	pass
+
+
+class QueueSink(EventSink):
+	def __init__(self, events, stop, delay=0.0):
+		self.events = events
+		self.stop = stop
+		# pause after each player action, so people can follow the game
+		self.delay = delay
+
+	def emit(self, kind, street, seat=-1, amount=0, cards=None):
+		event = Event(kind, street, seat, amount, cards)
+		while True:
+			if self.stop.is_set():
+				raise _Stopped()
+			try:
+				self.events.put(event, timeout=0.1)
+				break
+			except queue.Full:
+				pass
+		if self.delay and CHECK <= kind <= FOLD:
+			self.stop.wait(self.delay)
+
+
+def simulate(nplayers, events, stop, delay=0.0, seed=None, hands=None):
+	# worker body, thread or process
+	rng = random.Random(seed)
+	random.seed(rng.getrandbits(64))
+	match = PokerMatch([AIPlayer('P{}'.format(i)) for i in range(nplayers)], sink=QueueSink(events, stop, delay), rng=rng)
+	n = 0
+	try:
+		while not stop.is_set() and (hands is None or n < hands):
+			match.play_hand()
+			match.rotate()
+			n+= 1
+	except _Stopped:
+		pass
+
+
+class SimulationWorker(object):
+	def __init__(self, nplayers, delay=0.3, seed=None, hands=None, process=False, maxsize=1024):
+		if process:
+			self.events = multiprocessing.Queue(maxsize)
+			self.stop_event = multiprocessing.Event()
+			self.worker = multiprocessing.Process(target=simulate, args=(nplayers, self.events, self.stop_event, delay, seed, hands), daemon=True)
+		else:
+			self.events = queue.Queue(maxsize)
+			self.stop_event = threading.Event()
+			self.worker = threading.Thread(target=simulate, args=(nplayers, self.events, self.stop_event, delay, seed, hands), daemon=True)
+
+
+	def start(self):
+		self.worker.start()
+		return self
+
+
+	def poll(self, limit=256):
+		# events waiting now, at most limit of them; never blocks
+		out = []
+		try:
+			while len(out) < limit:
+				out.append(self.events.get_nowait())
+		except queue.Empty:
+			pass
+		return out
+
+
+	def stop(self):
+		self.stop_event.set()
+		self.worker.join(1.0)
+
+
+class TableSnapshot(object):
+	# What the view shows, rebuilt from events on the render thread
+	def __init__(self, nplayers):
+		self.nplayers = nplayers
+		self.stacks = [STACK] * nplayers
+		self.actions = [''] * nplayers
+		self.street_bets = [0] * nplayers
+		self.board = []
+		self.pot = 0
+		self.hands = 0
+		# seats whose HUD text changed since the last take_changes()
+		self.changed = set(range(nplayers))
+		self.board_changed = True
+
+
+	def apply(self, event):
+		kind, street, seat, amount, cards = event
+		if kind == NEW_HAND:
+			self.board = []
+			self.pot = 0
+			self.street_bets = [0] * self.nplayers
+			self.actions = [''] * self.nplayers
+			self.changed.update(range(self.nplayers))
+			self.board_changed = True
+		elif kind == BLIND or kind == BET or kind == RAISE:
+			self.stacks[seat]-= amount - self.street_bets[seat]
+			self.street_bets[seat] = amount
+			self.actions[seat] = 'blind {}'.format(amount) if kind == BLIND else describe(kind, '', amount).strip().lower()
+			self.changed.add(seat)
+		elif kind == CALL or kind == CHECK or kind == FOLD:
+			self.stacks[seat]-= amount
+			self.street_bets[seat]+= amount
+			self.actions[seat] = describe(kind, '', amount).strip().lower()
+			self.changed.add(seat)
+		elif kind == BOARD:
+			self.board.extend(cards)
+			self.board_changed = True
+		elif kind == ROUND_END:
+			self.pot = amount
+			self.street_bets = [0] * self.nplayers
+			self.board_changed = True
+		elif kind == SHOWDOWN:
+			self.actions[seat] = ' '.join(str(c) for c in cards)
+			self.changed.add(seat)
+		elif kind == WIN:
+			self.stacks[seat]+= amount
+			self.actions[seat] = 'wins {}'.format(amount)
+			self.changed.add(seat)
+		elif kind == HAND_END:
+			self.hands+= 1
+
+
+	def hud_text(self, seat):
+		return ['P{}: ${}'.format(seat, self.stacks[seat]), self.actions[seat]]
+
+
+	def board_text(self):
+		return 'Pot {}  {}'.format(self.pot, ' '.join(str(c) for c in self.board))
+
+
+	def take_changes(self):
+		changed = self.changed
+		self.changed = set()
+		return changed
+
+
+if __name__ == '__main__':
+	# headless check of the feed: events per second through the queue with no delay
+	worker = SimulationWorker(8, delay=0.0, seed=1).start()
+	snapshot = TableSnapshot(8)
+	t = time.time()
+	n = 0
+	while time.time() - t < 2.0:
+		for e in worker.poll():
+			snapshot.apply(e)
+			n+= 1
+	worker.stop()
+	print('{} events, {} hands in 2s'.format(n, snapshot.hands))
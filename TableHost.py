@@ -0,0 +1,204 @@
+import asyncio
+import sys
+from Events import *
+from PokerMatch import PokerMatch, PokerPlayer, AIPlayer
+
+# Many PokerMatch tables in one asyncio event loop. A table is a task that awaits the
+# player to act, so a table waiting on a slow or remote player costs one suspended
+# coroutine and nothing else. Plain PokerPlayers (bots) are still called directly.
+
+
+class AsyncPlayer(PokerPlayer):
+	# players that answer asynchronously implement act_async; act() is never called by the host
+	async def act_async(self, options):
+		return self.act(options)
+
+
+class StreamPlayer(AsyncPlayer):
+	# A player on the other end of a line-based text stream (socket or stdin/stdout).
+	# Each decision sends one line:
+	#   ACT <n> | <hole cards> | <board> | pot <pot> | <option>,<option>,...
+	# and reads back one line with the chosen option, optionally prefixed by n. Anything
+	# else counts as no answer; late answers to earlier prompts (an older n) are skipped.
+	def __init__(self, name, reader, writer=None):
+		super().__init__(name)
+		self.reader = reader
+		# None writes to stdout
+		self.writer = writer
+		self.connected = True
+		self.prompts = 0
+
+
+	async def send(self, line):
+		if self.writer is None:
+			print(line, flush=True)
+			return
+		self.writer.write((line + '\n').encode())
+		await self.writer.drain()
+
+
+	async def act_async(self, options):
+		if not self.connected:
+			return None
+		match = self.match
+		self.prompts+= 1
+		await self.send('ACT {} | {} | {} | pot {} | {}'.format(self.prompts, ' '.join(str(c) for c in self.cards),
+						' '.join(str(c) for c in match.communityCards), match.state.total_pot(), ','.join(options)))
+		while True:
+			line = await self.reader.readline()
+			if not line:
+				self.connected = False
+				return None
+			words = line.decode().split()
+			if len(words) == 2 and words[0].isdigit():
+				if int(words[0]) != self.prompts:
+					continue
+				words = words[1:]
+			return words[0].lower() if len(words) == 1 else None
+
+
+	def close(self):
+		self.connected = False
+		if self.writer is not None:
+			self.writer.close()
+
+
+class AsyncMatch(PokerMatch):
+	# PokerMatch whose betting rounds await the players, with a per-action timeout
+	def __init__(self, players, sink=None, rng=None, timeout=30.0):
+		super().__init__(players, sink=sink if sink is not None else NullSink(), rng=rng)
+		self.timeout = timeout
+		self.timeouts = 0
+
+
+	async def ask(self, p_idx, options):
+		player = self.players[p_idx]
+		if not isinstance(player, AsyncPlayer):
+			return player.act(options)
+		try:
+			action = await asyncio.wait_for(player.act_async(options), self.timeout)
+		except asyncio.TimeoutError:
+			action = None
+		if action not in options:
+			# no answer in time, a dropped connection or an invalid option
+			self.timeouts+= 1
+			action = 'check' if 'check' in options else 'fold'
+		return action
+
+
+	async def betting_round_async(self):
+		state = self.state
+		while not state.round_over:
+			p_idx = state.to_act
+			self.apply_action(p_idx, await self.ask(p_idx, state.legal_actions()))
+		return self.end_round()
+
+
+	async def play_hand_async(self):
+		self.deal_hand()
+		players, _ = await self.betting_round_async()
+		street = PREFLOP
+
+		for next_street, cc in ((FLOP, 3), (TURN, 1), (RIVER, 1)):
+			if len(players) == 1:
+				break
+			street = next_street
+			self.deal_street(cc)
+			players, _ = await self.betting_round_async()
+
+		return self.finish_hand(players, street)
+
+
+class TableHost(object):
+	def __init__(self, timeout=30.0):
+		self.timeout = timeout
+		self.tables = []
+		self.tasks = set()
+		self.hands = 0
+
+
+	def open_table(self, players, sink=None, rng=None):
+		match = AsyncMatch(players, sink=sink, rng=rng, timeout=self.timeout)
+		self.tables.append(match)
+		return match
+
+
+	def add_table(self, players, hands=None, sink=None, rng=None):
+		# call from inside the running loop; the table plays as a task of its own
+		match = self.open_table(players, sink, rng)
+		task = asyncio.get_running_loop().create_task(self.run_table(match, hands))
+		self.tasks.add(task)
+		task.add_done_callback(self.tasks.discard)
+		return match
+
+
+	async def run_table(self, match, hands=None):
+		# hands=None plays until the task is cancelled
+		n = 0
+		while hands is None or n < hands:
+			await match.play_hand_async()
+			match.rotate()
+			self.hands+= 1
+			n+= 1
+			# bot-only tables never wait on anything, let the other tables run between hands
+			await asyncio.sleep(0)
+		return n
+
+
+	async def join(self):
+		while self.tasks:
+			await asyncio.gather(*list(self.tasks))
+
+
+	async def serve(self, host='127.0.0.1', port=9999, seats=3, hands=None):
+		# every connection gets a table of its own, filled with AIPlayers
+		async def connected(reader, writer):
+			player = StreamPlayer('Remote-{}'.format(len(self.tables)), reader, writer)
+			players = [player] + [AIPlayer('AI-{}'.format(i)) for i in range(1, seats)]
+			match = self.open_table(players)
+			try:
+				await self.run_table(match, hands)
+			finally:
+				player.close()
+				self.tables.remove(match)
+
+		server = await asyncio.start_server(connected, host, port)
+		async with server:
+			await server.serve_forever()
+
+
+async def stdin_player(name='You'):
+	# StreamPlayer reading answers from stdin, prompts go to stdout
+	loop = asyncio.get_running_loop()
+	reader = asyncio.StreamReader()
+	await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+	return StreamPlayer(name, reader)
+
+
+async def _bench(ntables, hands, seats):
+	import time
+	host = TableHost()
+	for i in range(ntables):
+		host.add_table([AIPlayer('AI-{}'.format(j)) for j in range(seats)], hands)
+	t = time.time()
+	await host.join()
+	elapsed = time.time() - t
+	print('{} tables, {} hands in {:.2f}s: {:.0f} hands/s'.format(ntables, host.hands, elapsed, host.hands / elapsed))
+
+
+async def _play_stdin(seats, hands):
+	host = TableHost(timeout=120.0)
+	player = await stdin_player()
+	host.add_table([player] + [AIPlayer('AI-{}'.format(i)) for i in range(1, seats)], hands, sink=ConsoleSink())
+	await host.join()
+
+
+if __name__ == '__main__':
+	# TableHost.py bench [tables] | serve [port] | stdin
+	mode = sys.argv[1] if len(sys.argv) > 1 else 'bench'
+	if mode == 'serve':
+		asyncio.run(TableHost().serve(port=int(sys.argv[2]) if len(sys.argv) > 2 else 9999))
+	elif mode == 'stdin':
+		asyncio.run(_play_stdin(3, 100))
+	else:
+		asyncio.run(_bench(int(sys.argv[2]) if len(sys.argv) > 2 else 1000, 20, 6))